@@ -0,0 +1,215 @@
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter, sleep
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+# API latency benchmark: slow commands vs the cheap requests around them.
+# Concurrent clients press "prev" through POST /control/playback (LED ramps with
+# real sleeps) and follow each command on /commands/{id}, while others poll the
+# cheap endpoints. Before the command queues, a "prev" stalled the event loop and
+# every poll behind it.
+#
+# By default it starts a private dbus-daemon with a fake spotifyd on it (this
+# script again in --serve-player mode) and serves the API from a subprocess
+# (--serve-api) with mock GPIO pins and a temporary config. Needs dbus-daemon,
+# dbus-next, httpx, uvicorn and gpiozero.
+#
+#   python benchmarks/bench_api_latency.py [--clients 4] [--presses 10] [--polls 40]
+#   python benchmarks/bench_api_latency.py --src /tmp/nexo-before/src   # another tree, e.g. a git worktree
+#   python benchmarks/bench_api_latency.py --url http://nexo.local:8000  # a running speaker
+
+POLLED = ["/network/ssid", "/status/volume", "/"]
+
+# Fake spotifyd
+
+def serve_player():
+    from dbus_next.aio import MessageBus
+    from dbus_next.service import ServiceInterface, method, dbus_property
+    from dbus_next.constants import PropertyAccess
+    from dbus_next import Variant
+
+    class Player(ServiceInterface):
+        def __init__(self):
+            super().__init__("org.mpris.MediaPlayer2.Player")
+            self._status = "Playing"
+
+        @method()
+        def PlayPause(self):
+            self._status = "Paused" if self._status == "Playing" else "Playing"
+            self.emit_properties_changed({"PlaybackStatus": self._status})
+
+        @method()
+        def Next(self):
+            pass
+
+        @method()
+        def Previous(self):
+            pass
+
+        @dbus_property(access=PropertyAccess.READ)
+        def PlaybackStatus(self) -> "s":
+            return self._status
+
+        @dbus_property(access=PropertyAccess.READ)
+        def Metadata(self) -> "a{sv}":
+            return {"xesam:title": Variant("s", "Song"), "mpris:length": Variant("x", 200000000)}
+
+        @dbus_property(access=PropertyAccess.READ)
+        def Position(self) -> "x":
+            return 12000000
+
+        @dbus_property(access=PropertyAccess.READ)
+        def Volume(self) -> "d":
+            return 0.5
+
+    async def main():
+        bus = await MessageBus().connect()
+        bus.export("/org/mpris/MediaPlayer2", Player())
+        await bus.request_name("org.mpris.MediaPlayer2.spotifyd.instance1")
+        print("ready", flush=True)
+        await asyncio.Future()
+
+    asyncio.run(main())
+
+# API server
+
+def serve_api(port, src):
+    sys.path.insert(0, src)
+    import uvicorn
+    from api import app
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _wait_for_port(port, process, timeout=30):
+    deadline = perf_counter() + timeout
+    while perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("API server exited during startup")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            sleep(0.1)
+    raise RuntimeError("API server did not start")
+
+# Benchmark
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    return latencies[len(latencies) // 2] * 1000, latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+
+async def bench(url, clients, presses, polls):
+    import httpx
+
+    results = {"POST /control/playback prev": [], "GET /commands/{id}?wait": [], "command done (press to done)": []}
+    results.update({f"GET {path} (concurrent)": [] for path in POLLED})
+    failures = []
+
+    async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+        async def presser():
+            for _ in range(presses):
+                start = perf_counter()
+                response = await client.post("/control/playback", json={"value": "prev"})
+                results["POST /control/playback prev"].append(perf_counter() - start)
+                cmd_id = response.json().get("command_id") # Absent before the command queues: the press was inline
+                if cmd_id is None:
+                    continue
+                wait_start = perf_counter()
+                record = (await client.get(f"/commands/{cmd_id}", params={"wait": 10})).json()
+                done = perf_counter()
+                results["GET /commands/{id}?wait"].append(done - wait_start)
+                results["command done (press to done)"].append(done - start)
+                if record.get("status") != "done":
+                    failures.append(f"{cmd_id}: {record.get('status')} {record.get('error', '')}")
+
+        async def poller(path):
+            for _ in range(polls):
+                start = perf_counter()
+                await client.get(path)
+                results[f"GET {path} (concurrent)"].append(perf_counter() - start)
+                await asyncio.sleep(0.02)
+
+        await asyncio.gather(
+            *(presser() for _ in range(clients)),
+            *(poller(POLLED[i % len(POLLED)]) for i in range(clients)),
+        )
+    return results, failures
+
+def run_local(src, args):
+    daemon = subprocess.Popen(
+        ["dbus-daemon", "--session", "--nofork", "--print-address"],
+        stdout=subprocess.PIPE, text=True,
+    )
+    player = server = None
+    try:
+        address = daemon.stdout.readline().strip()
+        env = dict(
+            os.environ,
+            DBUS_SESSION_BUS_ADDRESS=address,
+            DBUS_SYSTEM_BUS_ADDRESS=address, # Keeps BlueZ lookups off the real System Bus
+            NEXO_CONFIG_FILE=str(Path(tempfile.mkdtemp()) / "nexo_config.json"),
+        )
+        env.setdefault("GPIOZERO_PIN_FACTORY", "mock")
+        player = subprocess.Popen([sys.executable, __file__, "--serve-player"], stdout=subprocess.PIPE, text=True, env=env)
+        if player.stdout.readline().strip() != "ready":
+            raise RuntimeError("fake spotifyd did not start")
+
+        port = _free_port()
+        server = subprocess.Popen(
+            [sys.executable, __file__, "--serve-api", str(port), "--src", src],
+            stdout=subprocess.DEVNULL, env=env,
+        )
+        _wait_for_port(port, server)
+        return asyncio.run(bench(f"http://127.0.0.1:{port}", args.clients, args.presses, args.polls))
+    finally:
+        for process in (server, player, daemon):
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="API latency benchmark")
+    parser.add_argument("--clients", type=int, default=4, help="Pressing clients, and as many polling clients")
+    parser.add_argument("--presses", type=int, default=10, help="Presses per pressing client")
+    parser.add_argument("--polls", type=int, default=40, help="Requests per polling client")
+    parser.add_argument("--src", default=str(SRC), help="src directory of the tree to serve")
+    parser.add_argument("--url", help="Benchmark a running API instead of serving one")
+    parser.add_argument("--serve-player", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--serve-api", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_player:
+        serve_player()
+        return
+    if args.serve_api is not None:
+        serve_api(args.serve_api, args.src)
+        return
+
+    if args.url:
+        results, failures = asyncio.run(bench(args.url.rstrip("/"), args.clients, args.presses, args.polls))
+    else:
+        results, failures = run_local(args.src, args)
+
+    print(f"{args.clients} clients x {args.presses} presses, {args.clients} clients x {args.polls} polls")
+    for label, latencies in results.items():
+        if latencies:
+            p50, p99 = percentiles(latencies)
+            print(f"{label:34s} p50 {p50:8.1f} ms  p99 {p99:8.1f} ms  (n={len(latencies)})")
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+from pathlib import Path
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+# BlueZ lookup benchmark: the in-memory object index vs a GetManagedObjects scan per call.
+# Starts a private dbus-daemon, runs this script again in --serve mode as a fake
+# org.bluez exporting N paired devices on it, and times get_connected_devices()
+# against the full scan it replaced. Needs dbus-daemon and dbus-next.
+# Keep --devices in the low hundreds: dbus-next's own GetManagedObjects reply
+# in the fake stops arriving somewhere past ~200 objects.
+#
+#   python benchmarks/bench_bluez_index.py [--devices 100] [--calls 200]
+
+# Fake BlueZ
+
+def serve(devices):
+    from dbus_next.aio import MessageBus
+    from dbus_next.service import ServiceInterface, dbus_property
+    from dbus_next.constants import PropertyAccess
+
+    class Device(ServiceInterface):
+        def __init__(self, address, connected):
+            super().__init__("org.bluez.Device1")
+            self._address = address
+            self._connected = connected
+
+        @dbus_property(access=PropertyAccess.READ)
+        def Address(self) -> "s":
+            return self._address
+
+        @dbus_property(access=PropertyAccess.READ)
+        def Name(self) -> "s":
+            return f"Phone {self._address}"
+
+        @dbus_property(access=PropertyAccess.READ)
+        def Paired(self) -> "b":
+            return True
+
+        @dbus_property(access=PropertyAccess.READ)
+        def Connected(self) -> "b":
+            return self._connected
+
+    async def main():
+        bus = await MessageBus().connect()
+        await bus.request_name("org.bluez")
+        for i in range(devices):
+            address = f"00:00:00:00:{i // 256:02X}:{i % 256:02X}"
+            bus.export(f"/org/bluez/hci0/dev_{address.replace(':', '_')}", Device(address, i == 0))
+        print("ready", flush=True)
+        await asyncio.Future()
+
+    asyncio.run(main())
+
+# Benchmark
+
+def timed(fn, calls):
+    latencies = []
+    for _ in range(calls):
+        start = perf_counter()
+        result = fn()
+        latencies.append(perf_counter() - start)
+    latencies.sort()
+    return result, latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.99)] * 1000
+
+def bench(devices, calls):
+    daemon = subprocess.Popen(
+        ["dbus-daemon", "--session", "--nofork", "--print-address"],
+        stdout=subprocess.PIPE, text=True,
+    )
+    fake = None
+    try:
+        address = daemon.stdout.readline().strip()
+        env = dict(os.environ, DBUS_SESSION_BUS_ADDRESS=address)
+        fake = subprocess.Popen(
+            [sys.executable, __file__, "--serve", str(devices)], stdout=subprocess.PIPE, text=True, env=env,
+        )
+        if fake.stdout.readline().strip() != "ready":
+            raise RuntimeError("fake BlueZ did not start")
+
+        os.environ["DBUS_SYSTEM_BUS_ADDRESS"] = address # Before the helper opens its System Bus
+        import bluetooth_helper
+        import dbus_loop
+
+        async def scan():
+            obj_manager = await bluetooth_helper._get_interface("/", "org.freedesktop.DBus.ObjectManager")
+            objects = await obj_manager.call_get_managed_objects()
+            return [
+                interfaces[bluetooth_helper.DEVICE_IFACE]["Address"].value
+                for interfaces in objects.values()
+                if bluetooth_helper.DEVICE_IFACE in interfaces
+                and interfaces[bluetooth_helper.DEVICE_IFACE]["Connected"].value
+            ]
+
+        start = perf_counter()
+        dbus_loop.run(bluetooth_helper._ensure_index()) # Raises, unlike get_connected_devices()
+        seed_ms = (perf_counter() - start) * 1000
+
+        indexed = timed(bluetooth_helper.get_connected_devices, calls)
+        scanned = timed(lambda: dbus_loop.run(scan()), calls)
+        return seed_ms, indexed, scanned
+    finally:
+        for process in (fake, daemon):
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="BlueZ object index benchmark")
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--serve", type=int, metavar="N", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve is not None:
+        serve(args.serve)
+        return
+
+    seed_ms, indexed, scanned = bench(args.devices, args.calls)
+    print(f"{args.devices} devices, {args.calls} get_connected_devices() calls (seeding the index: {seed_ms:.1f} ms)")
+    for label, (result, p50, p99) in (("index", indexed), ("GetManagedObjects scan", scanned)):
+        print(f"{label:24s} p50 {p50:8.3f} ms  p99 {p99:8.3f} ms  connected {result}")
+    if sorted(indexed[0]) != sorted(scanned[0]):
+        print("MISMATCH: the index and the scan disagree")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import argparse
+import os
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+# Keep the module-level store away from the real config
+os.environ.setdefault("NEXO_CONFIG_FILE", str(Path(tempfile.mkdtemp()) / "nexo_config.json"))
+
+import data_handler
+
+# Config store benchmark: whole-file JSON rewrites vs the append-only journal.
+# Sets cycle through the high-churn keys (volume, current_eq_*) in immediate mode,
+# so every set is one durable write, and both stores are reloaded afterwards to
+# check they come back with the same values.
+#
+#   python benchmarks/bench_config_store.py [--sets 500] [--dir /path/on/the/sd/card]
+#
+# Point --dir at the SD card for real latencies; the default temp dir is often tmpfs.
+
+KEYS = ("volume", "current_eq_bass", "current_eq_treble")
+
+def bench(cls, directory, sets):
+    path = Path(tempfile.mkdtemp(dir=directory)) / "nexo_config.json"
+    store = cls(path, write_behind=False)
+    bytes_before = store.get_write_stats()["bytes_written"]
+
+    latencies = []
+    for i in range(sets):
+        start = perf_counter()
+        store.set(KEYS[i % len(KEYS)], i)
+        latencies.append(perf_counter() - start)
+    written = store.get_write_stats()["bytes_written"] - bytes_before
+    expected = {key: store.get(key) for key in KEYS}
+    store.close()
+
+    reloaded = cls(path, write_behind=False)
+    reload_ok = all(reloaded.get(key) == value for key, value in expected.items())
+
+    latencies.sort()
+    return {
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+        "bytes_per_set": written / sets,
+        "reload_ok": reload_ok,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Config store write benchmark")
+    parser.add_argument("--sets", type=int, default=500)
+    parser.add_argument("--dir", default=None, help="Directory to write the test stores in")
+    args = parser.parse_args()
+
+    print(f"{args.sets} sets, immediate mode")
+    for cls in (data_handler.DataHandler, data_handler.JournaledDataHandler):
+        result = bench(cls, args.dir, args.sets)
+        print(
+            f"{cls.__name__:22s} p50 {result['p50_ms']:.3f} ms  p99 {result['p99_ms']:.3f} ms  "
+            f"{result['bytes_per_set']:6.0f} bytes/set  reload {'ok' if result['reload_ok'] else 'MISMATCH'}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,22 @@
-from fastapi import FastAPI, BackgroundTasks, HTTPException
+import asyncio
+import json
+import uuid
+from threading import Thread, Condition
+from time import monotonic, perf_counter
+from typing import List, Optional
+
+from fastapi import FastAPI, HTTPException, Response, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 
 from data_handler import db
 import main_controller as controller
 import carla_osc as carla
+import command_queue
+import group
+import metrics
+import tracing
 
 app = FastAPI(title="Nexo Speaker API")
 
@@ -13,10 +25,60 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], # We can't really restrict to one IP cause of the mobile app
     allow_credentials=True,
-    allow_methods=["POST", "GET"],
-    allow_headers=["Content-Type"],
+    allow_methods=["POST", "GET", "DELETE"],
+    allow_headers=["Content-Type", "If-None-Match"],
+    expose_headers=["ETag", "X-Version", "X-Trace-Id"],
 )
 
+class _MetricsMiddleware:
+    """Times every HTTP request into nexo_http_request_seconds, labelled by route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = perf_counter()
+        status = 500 # Unless a response gets started
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router records the matched route in the scope; unmatched paths share one label
+            route = getattr(scope.get("route"), "path", "unmatched")
+            metrics.http_request_seconds.observe(
+                perf_counter() - start, method=scope["method"], route=route, status=str(status),
+            )
+
+class _TracingMiddleware:
+    """Starts a trace for every request that changes something (not GETs) and returns its id in X-Trace-Id."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS"):
+            return await self.app(scope, receive, send)
+
+        with tracing.trace(f"api {scope['method']} {scope['path']}") as trace_id:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    message = dict(message, headers=list(message.get("headers", [])) + [(b"x-trace-id", trace_id.encode())])
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+
+app.add_middleware(_TracingMiddleware)
+app.add_middleware(_MetricsMiddleware)
+
 # Pydantic data models
 # Defines the shape of data expected in requests
 class VolumeRequest(BaseModel):
@@ -33,51 +95,119 @@ class NetworkConnectRequest(BaseModel):
     ssid: str
     password: str
 
+class BatchOperation(BaseModel):
+    op: str # "volume", "eq", "eq_status" or "playback"
+    volume: Optional[int] = None # op "volume": 0-100
+    band_type: Optional[str] = None # op "eq": "bass" or "treble"
+    preset: Optional[int] = None # op "eq": -6 to 6
+    value: Optional[str] = None # op "eq_status": "on"/"off", op "playback": "play_pause"/"next"/"prev"
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+
+class GroupPeerRequest(BaseModel):
+    url: str # e.g. "http://192.168.1.21:8000"
+    timeout: Optional[float] = None # Seconds, group.PEER_TIMEOUT if not set
+
+# Conditional requests
+# /status/state, /control/eq and /settings are versioned, pre-serialized documents.
+# Clients send the ETag back in If-None-Match and get a 304 while nothing changed,
+# or long-poll with ?since=<X-Version>&wait=<seconds> to be answered as soon as it does.
+
+LONG_POLL_MAX = 60 # Seconds a long-poll may be held
+BOOT_ID = uuid.uuid4().hex[:8] # Versions restart at boot, so ETags carry the boot too
+
+async def _versioned_response(request, since, wait, version, render, hubs=None):
+    """
+    version() -> int, render() -> (version, JSON body).
+    Holds the request while version() <= since (up to wait seconds), then answers 304 or the body.
+    hubs are the state hubs whose changes can move version() (default: the controller's).
+    """
+    if since is not None and wait > 0:
+        deadline = monotonic() + min(wait, LONG_POLL_MAX)
+        hubs = hubs or [controller.hub]
+        # Any other since (older, or from before a reboot) is answered right away
+        while version() == since:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                break
+            waits = [asyncio.ensure_future(hub.wait_for_change(hub.version, remaining)) for hub in hubs]
+            _, pending = await asyncio.wait(waits, return_when=asyncio.FIRST_COMPLETED)
+            for task in pending:
+                task.cancel()
+
+    current, body = render()
+    etag = f'"{BOOT_ID}-{current}"'
+    headers = {"ETag": etag, "X-Version": str(current), "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 # Api endpoints
 
 @app.get("/")
-def read_root():
-    return {"status": "online", "name": db.get("device_name"), "id": db.get("device_id"), "master": True}
+async def read_root():
+    return {"status": "online", "name": db.get("device_name"), "id": db.get("device_id"), "master": db.get("master", True)}
 
 # Settings endpoints
 @app.get("/settings")
-def get_settings():
-    return db.get_all()
+async def get_settings(request: Request, since: Optional[int] = None, wait: float = 0):
+    # Pre-serialized by the store, rebuilt only when the config version changes
+    return await _versioned_response(request, since, wait, lambda: db.version, lambda: (db.version, db.get_json()))
 
 @app.post("/settings/name")
-def update_name(name: str):
+async def update_name(name: str):
     db.set("device_name", name)
     return {"status": "updated", "name": name}
 
 # Control endpoints
 
-# We use BackgroundTasks so the API returns "OK" immediately,
-# while the actual hardware work happens in the background.
+# Handlers are async and never block: hardware work is either posted to the
+# volume actor or queued on the controller's command queues, and the response
+# carries a command id that /commands/{id} reports on.
 
-def _hardware_set_volume(vol):
+def _hardware_set_volume(vol, on_applied=None):
     """Placeholder: Call your actual main.py logic here"""
     print(f"HARDWARE: Setting volume to {vol}%")
-    controller.change_volume(vol, override=True)
+    controller.change_volume(vol, override=True, on_applied=on_applied)
+
+def _eq_preset_gains(band_type, preset):
+    """Returns {freq: gain} for a preset (-6 to 6) of the given band type."""
+    presets = db.get("eq_presets")[band_type]
+    # Keys are strings once the config went through JSON, ints in a fresh default
+    bands = presets.get(str(abs(preset)), presets.get(abs(preset), {}))
+    gains = {}
+    for freq, gain in bands.items():
+        gains[int(freq)] = (1 - gain) if preset < 0 else gain  # Invert gain for negative presets
+    return gains
 
 def _hardware_set_eq(band_type, preset):
-    """Placeholder: Call your actual EQ setting logic here"""
-    print(f"HARDWARE: Setting EQ {band_type} to preset {preset}")
-    print(db.get("eq_presets"))
-    for freq, gain in db.get("eq_presets")[band_type][str(abs(preset))].items():
-        if preset < 0:
-            carla.set_eq_gain(int(freq), (1 - gain))  # Invert gain for negative presets
-        else:
-            carla.set_eq_gain(int(freq), gain)
-    # Save current EQ to DB
-    db.set(f"current_eq_{band_type}", preset)
+    """Applies one EQ preset as a single OSC bundle."""
+    _hardware_set_eq_presets({band_type: preset})
+
+def _hardware_set_eq_presets(presets, save=True):
+    """
+    Applies several EQ presets at once, e.g. {"bass": 2, "treble": -1}.
+    All bands land in Carla together in one OSC bundle.
+    """
+    print(f"HARDWARE: Setting EQ presets {presets}")
+    gains = {}
+    for band_type, preset in presets.items():
+        gains.update(_eq_preset_gains(band_type, preset))
+    carla.set_eq_gains(gains)
+
+    # Save current EQ to DB, as one change
+    if save:
+        db.update({f"current_eq_{band_type}": preset for band_type, preset in presets.items()})
 
 @app.post("/control/volume")
-async def set_volume(req: VolumeRequest, background_tasks: BackgroundTasks):
+async def set_volume(req: VolumeRequest):
     if req.volume < 0 or req.volume > 100:
         raise HTTPException(status_code=400, detail="Volume must be 0-100")
     
-    # Trigger hardware change
-    background_tasks.add_task(_hardware_set_volume, req.volume)
+    # Trigger hardware change (only posts to the volume actor, so it returns at once)
+    _hardware_set_volume(req.volume)
     
     return {"status": "processing", "target_volume": req.volume}
 
@@ -86,11 +216,11 @@ async def control_playback(req: PlaybackRequest):
     if req.value not in ["play_pause", "next", "prev"]:
         raise HTTPException(status_code=400, detail="Invalid playback action")
     print(f"HARDWARE: Media Action -> {req.value}")
-    controller.media_action(req.value)
-    return {"status": "executed", "action": req.value}
+    cmd_id = controller.commands.submit(req.value, controller.media_action, req.value)
+    return {"status": "queued", "action": req.value, "command_id": cmd_id}
 
 @app.post("/control/eq")
-def set_eq(req: EQRequest, background_tasks: BackgroundTasks):
+async def set_eq(req: EQRequest):
     print(f"HARDWARE: Setting EQ {req.band_type} to preset {req.preset}")
     try: 
         req.preset = int(req.preset)
@@ -100,31 +230,459 @@ def set_eq(req: EQRequest, background_tasks: BackgroundTasks):
         raise HTTPException(status_code=400, detail="band_type must be 'bass' or 'treble'")
     if req.preset < -6 or req.preset > 6:
         raise HTTPException(status_code=400, detail="preset must be between -6 and 6")
-    background_tasks.add_task(_hardware_set_eq, req.band_type, req.preset)
-    return {"status": "processing", "band_type": req.band_type, "preset": f"{req.band_type}-{req.preset}"}
+    cmd_id = controller.commands.submit("set_eq", _hardware_set_eq, req.band_type, req.preset)
+    return {"status": "processing", "band_type": req.band_type, "preset": f"{req.band_type}-{req.preset}", "command_id": cmd_id}
+
+_eq_document = (None, "") # (version, JSON) of the last /control/eq body
+
+def _eq_version():
+    # Both counters only grow, so their sum changes whenever either does
+    return db.version + carla.get_shadow_version()
+
+def _render_eq():
+    global _eq_document
+    version = _eq_version()
+    if _eq_document[0] != version:
+        # What the DSP actually holds, from carla_osc's record of sent values
+        dsp = {
+            "eq": carla.get_eq_state(carla.PLUGIN_EQ),
+            "loudness": carla.get_eq_state(carla.LOUDNESS_EQ),
+            "osc": carla.get_osc_stats(),
+        }
+        body = {"bass": db.get("current_eq_bass"), "treble": db.get("current_eq_treble"), "dsp": dsp}
+        _eq_document = (version, json.dumps(body))
+    return _eq_document
 
 @app.get("/control/eq")
-def get_current_eq():
-    current_eq_bass = db.get("current_eq_bass")
-    current_eq_treble = db.get("current_eq_treble")
-    return {"bass": current_eq_bass, "treble": current_eq_treble}
+async def get_current_eq(request: Request, since: Optional[int] = None, wait: float = 0):
+    # Settings changes come through the controller's hub, DSP-only changes through carla_osc's
+    return await _versioned_response(request, since, wait, _eq_version, _render_eq, [controller.hub, carla.dsp_hub])
 
 @app.post("/control/eq/status")
-def set_eq_status(value: str, background_tasks: BackgroundTasks):
+async def set_eq_status(value: str):
     """Sets the current EQ status without changing the EQ preset"""
     if value not in ["on", "off"]:
         raise HTTPException(status_code=400, detail="Value must be 'on' or 'off'")
     is_on = True if value == "on" else False
     db.set("eq_enabled", is_on)
-    background_tasks.add_task(_hardware_set_eq, "bass", db.get("current_eq_bass") if is_on else 0)
-    background_tasks.add_task(_hardware_set_eq, "treble", db.get("current_eq_treble") if is_on else 0)
-    return {"status": "updated", "eq_enabled": is_on}
+    # Turning off keeps the stored presets, so turning back on restores them
+    cmd_id = controller.commands.submit("set_eq_status", _hardware_set_eq_presets, {
+        "bass": db.get("current_eq_bass") if is_on else 0,
+        "treble": db.get("current_eq_treble") if is_on else 0,
+    }, save=False)
+    return {"status": "updated", "eq_enabled": is_on, "command_id": cmd_id}
+
+# Batch control
+# A batch is validated as a whole, then merged: the last value of each setting wins,
+# every EQ band goes to Carla in one bundle, the player is called at most once and
+# the config is written as one change. Scenes are stored batches.
+
+def _plan_batch(operations):
+    """Validates operations together and merges them into one plan. Raises HTTPException listing every problem."""
+    plan = {"volume": None, "eq": {}, "eq_enabled": None, "playback": None}
+    errors = []
+    for i, op in enumerate(operations):
+        if op.op == "volume":
+            if op.volume is None or op.volume < 0 or op.volume > 100:
+                errors.append(f"operations[{i}]: volume must be 0-100")
+            else:
+                plan["volume"] = op.volume
+        elif op.op == "eq":
+            if op.band_type not in ["bass", "treble"]:
+                errors.append(f"operations[{i}]: band_type must be 'bass' or 'treble'")
+            elif op.preset is None or op.preset < -6 or op.preset > 6:
+                errors.append(f"operations[{i}]: preset must be between -6 and 6")
+            else:
+                plan["eq"][op.band_type] = op.preset
+        elif op.op == "eq_status":
+            if op.value not in ["on", "off"]:
+                errors.append(f"operations[{i}]: value must be 'on' or 'off'")
+            else:
+                plan["eq_enabled"] = op.value == "on"
+        elif op.op == "playback":
+            if op.value not in ["play_pause", "next", "prev"]:
+                errors.append(f"operations[{i}]: invalid playback action")
+            elif plan["playback"] is not None:
+                errors.append(f"operations[{i}]: only one playback action per batch")
+            else:
+                plan["playback"] = op.value
+        else:
+            errors.append(f"operations[{i}]: unknown op '{op.op}'")
+
+    if not operations:
+        errors.append("operations must not be empty")
+    if errors:
+        raise HTTPException(status_code=400, detail=errors)
+    return plan
+
+def _hardware_apply_batch(plan):
+    """Applies a merged batch plan: one EQ bundle, one volume target, one config change, one player call."""
+    print(f"HARDWARE: Applying batch {plan}")
+    changes = {}
+
+    if plan["eq"] or plan["eq_enabled"] is not None:
+        presets = {band: plan["eq"].get(band, db.get(f"current_eq_{band}")) for band in ["bass", "treble"]}
+        enabled = plan["eq_enabled"] if plan["eq_enabled"] is not None else db.get("eq_enabled", True)
+        # Disabled EQ keeps the stored presets but sends flat gains, like /control/eq/status
+        _hardware_set_eq_presets(presets if enabled else {"bass": 0, "treble": 0}, save=False)
+        changes.update({f"current_eq_{band}": preset for band, preset in plan["eq"].items()})
+        if plan["eq_enabled"] is not None:
+            changes["eq_enabled"] = plan["eq_enabled"]
+
+    if plan["volume"] is not None:
+        controller.change_volume(plan["volume"], override=True)
+        changes["volume"] = plan["volume"] # The actor's own save then finds nothing new
+
+    if changes:
+        db.update(changes)
+
+    if plan["playback"] is not None:
+        controller.media_action(plan["playback"])
+
+@app.post("/control/batch")
+async def control_batch(req: BatchRequest):
+    """Applies several control operations as one change."""
+    plan = _plan_batch(req.operations)
+    cmd_id = controller.commands.submit("batch", _hardware_apply_batch, plan)
+    return {"status": "processing", "plan": plan, "command_id": cmd_id}
+
+# Scenes
+
+@app.get("/scenes")
+async def get_scenes():
+    """Returns the stored scenes, {name: operations}."""
+    return db.get("scenes", {})
+
+@app.post("/scenes/{name}")
+async def save_scene(name: str, req: BatchRequest):
+    """Stores (or replaces) a named scene after validating it like a batch."""
+    if not name or len(name) > 64:
+        raise HTTPException(status_code=400, detail="Scene name must be 1-64 characters")
+    _plan_batch(req.operations)
+    operations = [op.model_dump(exclude_none=True) for op in req.operations]
+    db.set("scenes", {**db.get("scenes", {}), name: operations})
+    return {"status": "saved", "name": name, "operations": operations}
+
+@app.delete("/scenes/{name}")
+async def delete_scene(name: str):
+    scenes = dict(db.get("scenes", {}))
+    if scenes.pop(name, None) is None:
+        raise HTTPException(status_code=404, detail="Unknown scene")
+    db.set("scenes", scenes)
+    return {"status": "deleted", "name": name}
+
+@app.post("/scenes/{name}/recall")
+async def recall_scene(name: str):
+    """Applies a stored scene as one batch."""
+    operations = db.get("scenes", {}).get(name)
+    if operations is None:
+        raise HTTPException(status_code=404, detail="Unknown scene")
+    plan = _plan_batch([BatchOperation(**op) for op in operations])
+    cmd_id = controller.commands.submit(f"scene:{name}", _hardware_apply_batch, plan)
+    return {"status": "processing", "name": name, "plan": plan, "command_id": cmd_id}
+
+# Group
+# The master applies a command locally, then sends the same request to every peer
+# in the stored group at once (see group.py). Peers are plain Nexos running this API.
+
+def _require_master():
+    if not db.get("master", True):
+        raise HTTPException(status_code=409, detail="This speaker is not a group master")
+
+@app.get("/group")
+async def get_group():
+    """Returns the stored group definition, {name: {"url", "timeout"}}."""
+    return {"master": db.get("master", True), "peers": group.get_peers()}
+
+@app.post("/group/peers/{name}")
+async def set_group_peer(name: str, req: GroupPeerRequest):
+    """Adds (or replaces) a peer speaker."""
+    _require_master()
+    if not name or len(name) > 64:
+        raise HTTPException(status_code=400, detail="Peer name must be 1-64 characters")
+    if not req.url.startswith(("http://", "https://")):
+        raise HTTPException(status_code=400, detail="url must start with http:// or https://")
+    if req.timeout is not None and not 0 < req.timeout <= 30:
+        raise HTTPException(status_code=400, detail="timeout must be between 0 and 30 seconds")
+    return {"status": "saved", "name": name, "peer": group.set_peer(name, req.url, req.timeout)}
+
+@app.delete("/group/peers/{name}")
+async def delete_group_peer(name: str):
+    """Removes a peer speaker."""
+    _require_master()
+    if not group.remove_peer(name):
+        raise HTTPException(status_code=404, detail="Unknown peer")
+    return {"status": "deleted", "name": name}
+
+@app.get("/group/status")
+async def get_group_status():
+    """Asks every peer whether it is online, concurrently."""
+    _require_master()
+    return {"peers": await group.fan_out("GET", "/")}
+
+@app.post("/group/control/volume")
+async def set_group_volume(req: VolumeRequest):
+    _require_master()
+    payload = req.model_dump()
+    local = await set_volume(req)
+    return {"local": local, "peers": await group.fan_out("POST", "/control/volume", payload)}
+
+@app.post("/group/control/eq")
+async def set_group_eq(req: EQRequest):
+    _require_master()
+    payload = req.model_dump() # Before set_eq turns the preset into an int
+    local = await set_eq(req)
+    return {"local": local, "peers": await group.fan_out("POST", "/control/eq", payload)}
+
+@app.post("/group/control/playback")
+async def control_group_playback(req: PlaybackRequest):
+    _require_master()
+    payload = req.model_dump()
+    local = await control_playback(req)
+    return {"local": local, "peers": await group.fan_out("POST", "/control/playback", payload)}
+
+@app.post("/group/control/batch")
+async def control_group_batch(req: BatchRequest):
+    _require_master()
+    payload = {"operations": [op.model_dump(exclude_none=True) for op in req.operations]}
+    local = await control_batch(req)
+    return {"local": local, "peers": await group.fan_out("POST", "/control/batch", payload)}
 
 @app.get("/status/state")
-def get_system_state():
-    """Returns current track info from main_controller."""
-    state_info = controller.get_full_system_state()
-    return state_info
+async def get_system_state(request: Request, since: Optional[int] = None, wait: float = 0):
+    """Returns the speaker state document from main_controller."""
+    hub = controller.hub
+    return await _versioned_response(request, since, wait, lambda: hub.version, controller.get_state_document)
+
+# Push endpoints
+# A client only remembers the last version it was sent. Whatever changed since then
+# goes out as one delta, so a slow client skips intermediate states instead of
+# queueing them, and the JSON is shared by every client on the same version.
+
+STREAM_KEEPALIVE = 30 # Seconds between keep-alive messages while nothing changes
+
+@app.websocket("/ws/state")
+async def state_socket(websocket: WebSocket):
+    """Streams the state document: a full snapshot first, then deltas."""
+    hub = controller.hub
+    await websocket.accept()
+    try:
+        since, body = hub.snapshot()
+        await websocket.send_text(body)
+        while True:
+            await hub.wait_for_change(since, STREAM_KEEPALIVE)
+            # On a timeout this is an empty delta, which doubles as the keep-alive
+            since, body = hub.delta(since)
+            await websocket.send_text(body)
+    except WebSocketDisconnect:
+        pass
+
+@app.get("/sse/state")
+async def state_events(request: Request):
+    """
+    Server-Sent Events fallback for /ws/state. Honors Last-Event-ID on reconnect.
+    Event ids are "<boot id>:<version>"; an id from another boot gets a full snapshot.
+    """
+    hub = controller.hub
+
+    async def events():
+        boot, _, last_version = request.headers.get("last-event-id", "").partition(":")
+        if boot == BOOT_ID and last_version.isdigit() and int(last_version) <= hub.version:
+            since = int(last_version)
+        else:
+            since, body = hub.snapshot()
+            yield f"id: {BOOT_ID}:{since}\ndata: {body}\n\n"
+        while not await request.is_disconnected():
+            if await hub.wait_for_change(since, STREAM_KEEPALIVE) == since:
+                yield ": keep-alive\n\n"
+                continue
+            since, body = hub.delta(since)
+            yield f"id: {BOOT_ID}:{since}\ndata: {body}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+# High-rate control channel
+# Sliders send {"seq": n, "control": "volume" | "bass" | "treble", "value": v} as fast as
+# they like. Only the newest value per control is kept; at most CONTROL_RATE times a
+# second those are applied and acked with {"ack": seq, ...}, where seq is the newest
+# sequence number applied (everything older was superseded, not queued). Volume goes
+# to the volume actor, EQ bands to a latest-value slot; either is acked once applied,
+# with the value that was applied (a newer one, if another client's replaced it).
+
+CONTROL_RATE = 20 # Max apply passes per second per connection
+CONTROL_RANGES = {"volume": (0, 100), "bass": (-6, 6), "treble": (-6, 6)}
+
+class _EqSlider:
+    """
+    Latest-value slot for EQ bands dragged over /ws/control, like the volume actor:
+    each band holds only its newest preset and one worker thread applies it.
+    Kept off the command queue, so a drag never waits behind a media action
+    and never pushes real commands out of the /commands history.
+    """
+
+    def __init__(self):
+        self.cond = Condition()
+        self.pending = {} # band -> (preset, trace context, [(loop, future)...])
+        self.thread = None
+
+    def post(self, band, preset):
+        """
+        Sets the band's pending preset. Returns an asyncio future that resolves to the preset
+        that was applied (a newer one if this was replaced first), or None if applying failed.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self.cond:
+            replaced = self.pending.get(band)
+            waiters = (replaced[2] if replaced else []) + [(loop, future)]
+            self.pending[band] = (preset, tracing.current(), waiters)
+            if self.thread is None:
+                self.thread = Thread(target=self._run, name="eq-slider", daemon=True)
+                self.thread.start()
+            self.cond.notify()
+        return future
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.pending:
+                    self.cond.wait()
+                band, (preset, context, waiters) = self.pending.popitem()
+            try:
+                with tracing.attach(context), tracing.span("eq.apply", band=band, preset=preset):
+                    _hardware_set_eq_presets({band: preset})
+                applied = preset
+            except Exception as e:
+                print(f"EQ Slider Error: {e}")
+                applied = None
+            for loop, future in waiters:
+                _settle(loop, future, applied)
+
+def _settle(loop, future, result):
+    """Resolves an asyncio future from any thread."""
+    def resolve():
+        if not future.done():
+            future.set_result(result)
+    try:
+        loop.call_soon_threadsafe(resolve)
+    except RuntimeError:
+        pass # Loop already closed
+
+_eq_slider = _EqSlider()
+
+def _apply_control(control, value):
+    """
+    Hands one control value to the hardware side without blocking.
+    Returns a future that resolves to the value that was applied, or None if it failed.
+    """
+    if control != "volume":
+        return _eq_slider.post(control, value)
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    _hardware_set_volume(value, on_applied=lambda volume: _settle(loop, future, volume)) # Posts to the volume actor
+    return future
+
+def _parse_control(message):
+    """Returns (seq, control, value) from a control message, or raises ValueError."""
+    if not isinstance(message, dict):
+        raise ValueError("message must be an object")
+    seq, control, value = message.get("seq"), message.get("control"), message.get("value")
+    if not isinstance(seq, int):
+        raise ValueError("seq must be an integer")
+    if control not in CONTROL_RANGES:
+        raise ValueError(f"control must be one of {sorted(CONTROL_RANGES)}")
+    low, high = CONTROL_RANGES[control]
+    if not isinstance(value, (int, float)) or not low <= value <= high:
+        raise ValueError(f"{control} must be between {low} and {high}")
+    return seq, control, int(round(value))
+
+@app.websocket("/ws/control")
+async def control_socket(websocket: WebSocket):
+    """Applies the newest value per control at a bounded rate and acks the applied sequence numbers."""
+    await websocket.accept()
+    pending = {} # control -> (seq, value, superseded)
+    last_seq = {} # control -> newest seq received, so late (reordered) messages are ignored
+    wake = asyncio.Event()
+
+    async def apply_loop():
+        while True:
+            await wake.wait()
+            wake.clear()
+            batch = dict(pending)
+            pending.clear()
+            acks = []
+            for control, (seq, value, superseded) in batch.items():
+                with tracing.trace("ws.control", control=control, seq=seq) as trace_id:
+                    applied = _apply_control(control, value)
+                acks.append((applied, {
+                    "ack": seq, "control": control, "value": value, "superseded": superseded, "trace_id": trace_id,
+                }))
+            # Acked once applied; meanwhile new values pile up in pending
+            for applied, ack in acks:
+                value = await applied
+                if value is None:
+                    ack = {"error": f"{ack['control']} {ack['value']} was not applied", "seq": ack["ack"], "control": ack["control"]}
+                else:
+                    ack["value"] = value
+                try:
+                    await websocket.send_json(ack)
+                except Exception:
+                    return # Client went away; the receive loop notices and cleans up
+            await asyncio.sleep(1 / CONTROL_RATE)
+
+    applier = asyncio.ensure_future(apply_loop())
+    try:
+        while True:
+            text = await websocket.receive_text()
+            try:
+                seq, control, value = _parse_control(json.loads(text))
+            except ValueError as e: # json.JSONDecodeError is a ValueError too
+                await websocket.send_json({"error": str(e)})
+                continue
+            if seq <= last_seq.get(control, -1):
+                continue
+            last_seq[control] = seq
+            superseded = pending[control][2] + 1 if control in pending else 0
+            pending[control] = (seq, value, superseded)
+            wake.set()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        applier.cancel()
+
+@app.get("/status/volume")
+async def get_volume_stats():
+    """Returns the volume actor's queue depth, coalescing and apply latency."""
+    return controller.get_volume_stats()
+
+@app.get("/status/storage")
+async def get_storage_stats():
+    """Returns config write counters (flushes, skipped writes, bytes written per hour)."""
+    return db.get_write_stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Counters and latency histograms in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# Traces
+
+@app.get("/traces")
+async def get_traces(trace_id: Optional[str] = None):
+    """
+    Downloads the trace buffer (or one trace) as Chrome trace-event JSON,
+    for Perfetto (ui.perfetto.dev) or chrome://tracing.
+    """
+    return Response(
+        json.dumps(tracing.export_chrome(trace_id)),
+        media_type="application/json",
+        headers={"Content-Disposition": 'attachment; filename="nexo-trace.json"'},
+    )
+
+@app.get("/traces/recent")
+async def get_recent_traces(limit: int = 20):
+    """Lists the newest traces (button presses, API calls, /ws/control values) with their durations."""
+    return tracing.recent(min(max(limit, 1), 200))
 
 @app.get("/status/partial_state")
 def get_partial_system_state():
@@ -133,52 +691,73 @@ def get_partial_system_state():
     return partial_info
 
 @app.get("/network/ssid")
-def get_network_ssid():
+async def get_network_ssid():
     """Returns the current connected WiFi SSID."""
     ssid = db.get("wifi")["ssid"]
     return {"ssid": ssid}
 
+SCAN_TIMEOUT = 20 # Seconds /network/scan waits before answering with just the command id
+
 @app.get("/network/scan")
-def scan_networks():
-    """Scans for available WiFi networks."""
-    networks = controller.scan_wifi_networks()
+async def scan_networks():
+    """Scans for available WiFi networks. Falls back to a command id if the scan takes too long."""
+    cmd_id = controller.network_commands.submit("scan_wifi", controller.scan_wifi_networks)
+    record = await command_queue.wait_for(cmd_id, SCAN_TIMEOUT)
+    if record["status"] != "done":
+        return {"networks": [], "status": record["status"], "command_id": cmd_id}
+    networks = record["result"]
     print(f"Scanned Networks: {networks}")
-    return {"networks": networks}
+    return {"networks": networks, "command_id": cmd_id}
 
 @app.post("/network/connect")
-def connect_network(req: NetworkConnectRequest, background_tasks: BackgroundTasks):
+async def connect_network(req: NetworkConnectRequest):
     """Connects to a specified WiFi network."""
     if not req.ssid or not req.password:
         raise HTTPException(status_code=400, detail="SSID and password are required")
-    background_tasks.add_task(controller.connect_to_wifi, req.ssid, req.password)
+    cmd_id = controller.network_commands.submit("connect_wifi", controller.connect_to_wifi, req.ssid, req.password)
     db.set("wifi", {"ssid": req.ssid, "password": req.password})
-    return {"status": "connecting", "ssid": req.ssid}
+    return {"status": "connecting", "ssid": req.ssid, "command_id": cmd_id}
 
 @app.post("/control/local/volume")
-def set_local_volume(req: VolumeRequest, background_tasks: BackgroundTasks):
+async def set_local_volume(req: VolumeRequest):
     """Sets the local hardware volume (e.g., amplifier) directly."""
     if req.volume < 0 or req.volume > 100:
         raise HTTPException(status_code=400, detail="Volume must be 0-100")
     print(f"HARDWARE: Setting LOCAL volume to {req.volume}%")
-    background_tasks.add_task(_hardware_set_volume, req.volume)
+    _hardware_set_volume(req.volume)
     return {"status": "executed", "local_volume": req.volume}
 
 @app.post("/control/local/mute")
-def set_local_mute(value: str, background_tasks: BackgroundTasks):
+async def set_local_mute(value: str):
     """Mutes or unmutes the local hardware volume directly."""
     if value not in ["mute", "unmute"]:
         raise HTTPException(status_code=400, detail="Value must be 'mute' or 'unmute'")
     mute = True if value == "mute" else False
     if mute:
         print("HARDWARE: Muting local volume")
-        background_tasks.add_task(_hardware_set_volume, 0)
+        _hardware_set_volume(0)
     else:
         print("HARDWARE: Unmuting local volume")
-        background_tasks.add_task(_hardware_set_volume, 100)
+        _hardware_set_volume(100)
     return {"status": "executed", "mute": mute}
 
 @app.post("/settings/reset")
-def reset_settings():
+async def reset_settings():
     """Resets all settings to default."""
-    db.reset_to_default()
-    return {"status": "reset_to_default"}
\ No newline at end of file
+    cmd_id = controller.commands.submit("reset_settings", db.reset_to_default)
+    return {"status": "reset_to_default", "command_id": cmd_id}
+
+# Commands
+
+COMMAND_WAIT_MAX = 60 # Seconds /commands/{id}?wait= may hold the request
+
+@app.get("/commands/{cmd_id}")
+async def get_command(cmd_id: str, wait: float = 0):
+    """Reports a queued command: queued, running, done (with its result) or failed (with the error)."""
+    if wait > 0:
+        record = await command_queue.wait_for(cmd_id, min(wait, COMMAND_WAIT_MAX))
+    else:
+        record = command_queue.get_command(cmd_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Unknown command id")
+    return record
\ No newline at end of file
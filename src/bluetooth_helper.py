@@ -1,157 +1,504 @@
 import asyncio
 from dbus_next.aio import MessageBus
 from dbus_next.constants import BusType
-from dbus_next import Variant
+from dbus_next import Message, MessageType, Variant, introspection as intr
+from threading import Lock
+
+import dbus_loop
+import metrics
+import tracing
+
+# One System Bus connection for the whole process, living on the shared
+# D-Bus loop (see dbus_loop.py). BlueZ's interfaces are stable, so we ship
+# their introspection data instead of asking for it on every call.
+
+BLUEZ = "org.bluez"
+VOLUME_WRITE_INTERVAL = 0.05 # Minimum seconds between AVRCP volume writes
+DEVICE_IFACE = "org.bluez.Device1"
+TRANSPORT_IFACE = "org.bluez.MediaTransport1"
+PLAYER_IFACE = "org.bluez.MediaPlayer1"
+ADAPTER_IFACE = "org.bluez.Adapter1"
+
+# Signals that keep the object index below in sync with BlueZ
+MATCH_RULES = [
+    f"type='signal',sender='{BLUEZ}',interface='org.freedesktop.DBus.ObjectManager',path='/'",
+    f"type='signal',sender='{BLUEZ}',interface='org.freedesktop.DBus.Properties',member='PropertiesChanged',path_namespace='/org/bluez'",
+    f"type='signal',sender='org.freedesktop.DBus',interface='org.freedesktop.DBus',member='NameOwnerChanged',arg0='{BLUEZ}'",
+]
+
+_PROPERTIES_XML = """
+  <interface name="org.freedesktop.DBus.Properties">
+    <method name="Get">
+      <arg name="interface" type="s" direction="in"/>
+      <arg name="name" type="s" direction="in"/>
+      <arg name="value" type="v" direction="out"/>
+    </method>
+    <method name="Set">
+      <arg name="interface" type="s" direction="in"/>
+      <arg name="name" type="s" direction="in"/>
+      <arg name="value" type="v" direction="in"/>
+    </method>
+    <method name="GetAll">
+      <arg name="interface" type="s" direction="in"/>
+      <arg name="properties" type="a{sv}" direction="out"/>
+    </method>
+    <signal name="PropertiesChanged">
+      <arg name="interface" type="s"/>
+      <arg name="changed_properties" type="a{sv}"/>
+      <arg name="invalidated_properties" type="as"/>
+    </signal>
+  </interface>
+"""
+
+_INTERFACES_XML = {
+    "org.freedesktop.DBus.ObjectManager": """
+  <interface name="org.freedesktop.DBus.ObjectManager">
+    <method name="GetManagedObjects">
+      <arg name="objects" type="a{oa{sa{sv}}}" direction="out"/>
+    </method>
+    <signal name="InterfacesAdded">
+      <arg name="object" type="o"/>
+      <arg name="interfaces" type="a{sa{sv}}"/>
+    </signal>
+    <signal name="InterfacesRemoved">
+      <arg name="object" type="o"/>
+      <arg name="interfaces" type="as"/>
+    </signal>
+  </interface>
+""",
+    "org.bluez.Device1": """
+  <interface name="org.bluez.Device1">
+    <method name="Connect"/>
+    <method name="Disconnect"/>
+    <property name="Address" type="s" access="read"/>
+    <property name="Name" type="s" access="read"/>
+    <property name="Paired" type="b" access="read"/>
+    <property name="Trusted" type="b" access="readwrite"/>
+    <property name="Connected" type="b" access="read"/>
+  </interface>
+""",
+    "org.bluez.Adapter1": """
+  <interface name="org.bluez.Adapter1">
+    <property name="Address" type="s" access="read"/>
+    <property name="Powered" type="b" access="readwrite"/>
+    <property name="Discoverable" type="b" access="readwrite"/>
+    <property name="Pairable" type="b" access="readwrite"/>
+  </interface>
+""",
+    "org.bluez.MediaTransport1": """
+  <interface name="org.bluez.MediaTransport1">
+    <property name="Device" type="o" access="read"/>
+    <property name="State" type="s" access="read"/>
+    <property name="Volume" type="q" access="readwrite"/>
+  </interface>
+""",
+    "org.bluez.MediaPlayer1": """
+  <interface name="org.bluez.MediaPlayer1">
+    <method name="Play"/>
+    <method name="Pause"/>
+    <method name="Next"/>
+    <method name="Previous"/>
+    <property name="Status" type="s" access="read"/>
+    <property name="Position" type="u" access="read"/>
+    <property name="Track" type="a{sv}" access="read"/>
+  </interface>
+""",
+}
+
+_bus = None
+_bus_lock = asyncio.Lock() # Concurrent first callers share one connect instead of each opening a bus
+_nodes = {} # interface name -> parsed introspection Node
+_proxies = {} # (path, interface) -> interface proxy
+
+# In-memory mirror of the BlueZ object tree.
+# Seeded once with GetManagedObjects, then kept current by InterfacesAdded,
+# InterfacesRemoved and PropertiesChanged, so lookups are dictionary reads.
+# Written on the D-Bus loop, read from any thread under _index_lock.
+_objects = {} # path -> {interface: {property: plain value}}
+_by_mac = {} # MAC address -> device path
+_by_interface = {} # interface -> set of paths
+_index_ready = False
+_index_lock = Lock()
+_connection_listeners = []
 
 async def _get_bus():
-    """Connect to the System Bus."""
-    return await MessageBus(bus_type=BusType.SYSTEM).connect()
+    """Returns the shared System Bus connection, reconnecting if it dropped."""
+    global _bus
+    async with _bus_lock:
+        if _bus is None or not _bus.connected:
+            bus = await MessageBus(bus_type=BusType.SYSTEM).connect()
+            try:
+                bus.add_message_handler(_on_message)
+                for rule in MATCH_RULES:
+                    await bus.call(Message(
+                        destination="org.freedesktop.DBus",
+                        path="/org/freedesktop/DBus",
+                        interface="org.freedesktop.DBus",
+                        member="AddMatch",
+                        signature="s",
+                        body=[rule],
+                    ))
+            except Exception:
+                bus.disconnect() # Half set up; don't leave it delivering signals
+                raise
+            _proxies.clear() # Proxies are bound to the old connection
+            _reset_index()
+            _bus = bus
+    return _bus
 
-async def _get_bluez_objects(bus):
-    """
-    Fetch all managed objects from BlueZ (Devices, Transports, Adapters).
-    This replaces the slow 'bluetoothctl' parsing.
-    """
-    # Get the ObjectManager
-    introspection = await bus.introspect("org.bluez", "/")
-    obj_manager = bus.get_proxy_object("org.bluez", "/", introspection)
-    iface = obj_manager.get_interface("org.freedesktop.DBus.ObjectManager")
-    
-    # Return dictionary of all objects
-    return await iface.call_get_managed_objects()
-
-async def _find_transport_path(bus):
-    """Finds the first active MediaTransport1 (A2DP Audio Stream)."""
-    objects = await _get_bluez_objects(bus)
-    
+# Object index
+
+def _unwrap(properties):
+    return {key: variant.value for key, variant in properties.items()}
+
+def _reset_index():
+    global _index_ready
+    with _index_lock:
+        _objects.clear()
+        _by_mac.clear()
+        _by_interface.clear()
+        _index_ready = False
+
+def _index_add(path, interfaces):
+    """Adds (or extends) an object in the index. interfaces: {name: {prop: plain value}}."""
+    with _index_lock:
+        entry = _objects.setdefault(path, {})
+        for interface, properties in interfaces.items():
+            entry.setdefault(interface, {}).update(properties)
+            _by_interface.setdefault(interface, set()).add(path)
+        address = entry.get(DEVICE_IFACE, {}).get("Address")
+        if address:
+            _by_mac[address] = path
+
+def _index_remove(path, interfaces):
+    """Drops interfaces from an object, and the object itself once none are left."""
+    with _index_lock:
+        entry = _objects.get(path, {})
+        for interface in interfaces:
+            entry.pop(interface, None)
+            _by_interface.get(interface, set()).discard(path)
+        if not entry:
+            _objects.pop(path, None)
+        if DEVICE_IFACE not in entry:
+            for address, device_path in list(_by_mac.items()):
+                if device_path == path:
+                    del _by_mac[address]
+
+def _index_update(path, interface, changed, invalidated):
+    """Applies a PropertiesChanged signal to an indexed object."""
+    with _index_lock:
+        properties = _objects.get(path, {}).get(interface)
+        if properties is None:
+            return # Not announced through InterfacesAdded (yet), nothing to update
+        properties.update(changed)
+        for name in invalidated:
+            properties.pop(name, None)
+
+async def _ensure_index():
+    """Seeds the index from GetManagedObjects the first time it is needed."""
+    global _index_ready
+    await _get_bus()
+    if _index_ready:
+        return
+    obj_manager = await _get_interface("/", "org.freedesktop.DBus.ObjectManager")
+    objects = await obj_manager.call_get_managed_objects()
     for path, interfaces in objects.items():
-        if "org.bluez.MediaTransport1" in interfaces:
-            # Found an audio transport
-            return path
-    return None
+        _index_add(path, {name: _unwrap(props) for name, props in interfaces.items()})
+    _index_ready = True
+
+def _on_message(msg):
+    """Keeps the index in sync with BlueZ (runs on the D-Bus loop)."""
+    if msg.message_type != MessageType.SIGNAL:
+        return
+
+    if msg.member == "InterfacesAdded":
+        path, interfaces = msg.body
+        interfaces = {name: _unwrap(props) for name, props in interfaces.items()}
+        _index_add(path, interfaces)
+        device = interfaces.get(DEVICE_IFACE, {})
+        if device.get("Connected"):
+            _notify_connection(device.get("Address"), True)
+
+    elif msg.member == "InterfacesRemoved":
+        path, interfaces = msg.body
+        _index_remove(path, interfaces)
+
+    elif msg.member == "PropertiesChanged" and msg.path.startswith("/org/bluez"):
+        interface, changed, invalidated = msg.body
+        changed = _unwrap(changed)
+        _index_update(msg.path, interface, changed, invalidated)
+        if interface == DEVICE_IFACE and "Connected" in changed:
+            with _index_lock:
+                address = _objects.get(msg.path, {}).get(DEVICE_IFACE, {}).get("Address")
+            _notify_connection(address, changed["Connected"])
 
-async def _set_volume_async(volume_percent):
-    """Async implementation of setting volume."""
+    elif msg.member == "NameOwnerChanged" and msg.body[0] == BLUEZ:
+        # bluetoothd restarted: everything we mirrored is gone, reseed on next use
+        _proxies.clear()
+        _reset_index()
+
+def _notify_connection(address, connected):
+    """Hands a Device1.Connected change to the listeners on the dispatcher thread."""
+    if not address:
+        return
+    for callback in _connection_listeners:
+        dbus_loop.dispatch(callback, address, connected)
+
+def _lookup(fn):
+    """Runs fn() against the index, seeding it on the D-Bus loop first if needed."""
+    if not _index_ready:
+        dbus_loop.run(_ensure_index())
+    with _index_lock:
+        return fn()
+
+def _connected_devices():
+    return [
+        _objects[path][DEVICE_IFACE]["Address"]
+        for path in _by_interface.get(DEVICE_IFACE, ())
+        if _objects[path][DEVICE_IFACE].get("Connected") and _objects[path][DEVICE_IFACE].get("Address")
+    ]
+
+def _transport_path():
+    return next(iter(_by_interface.get(TRANSPORT_IFACE, ())), None)
+
+def _adapter_path():
+    return next(iter(sorted(_by_interface.get(ADAPTER_IFACE, ()))), None)
+
+def _player_properties():
+    path = next(iter(_by_interface.get(PLAYER_IFACE, ())), None)
+    return dict(_objects[path][PLAYER_IFACE]) if path else None
+
+async def _get_interface(path, interface):
+    """Returns a cached proxy for `interface` on a BlueZ object, built from the static XML."""
     bus = await _get_bus()
-    try:
-        transport_path = await _find_transport_path(bus)
-        if not transport_path:
-            return
+    key = (path, interface)
+    if key not in _proxies:
+        if interface not in _nodes:
+            xml = _INTERFACES_XML.get(interface, "")
+            _nodes[interface] = intr.Node.parse(f"<node>{_PROPERTIES_XML}{xml}</node>")
+        proxy = bus.get_proxy_object(BLUEZ, path, _nodes[interface])
+        _proxies[key] = proxy.get_interface(interface)
+    return _proxies[key]
 
-        # Convert 0-100 to 0-127 (BlueZ uint16 scale)
-        vol_clamped = max(0, min(100, volume_percent))
-        bt_volume = int((vol_clamped / 100) * 127)
+async def _get_properties(path):
+    """Returns the Properties interface of a BlueZ object."""
+    return await _get_interface(path, "org.freedesktop.DBus.Properties")
 
-        # Get the Properties interface for this specific transport
-        introspection = await bus.introspect("org.bluez", transport_path)
-        proxy = bus.get_proxy_object("org.bluez", transport_path, introspection)
-        props = proxy.get_interface("org.freedesktop.DBus.Properties")
+async def _find_transport_path():
+    """Finds the first active MediaTransport1 (A2DP Audio Stream)."""
+    await _ensure_index()
+    with _index_lock:
+        return _transport_path()
+
+class _VolumeWriter:
+    """
+    Coalesces AVRCP absolute-volume writes.
+    Requests only record the newest target; one task on the D-Bus loop sends it,
+    at most once per VOLUME_WRITE_INTERVAL, and skips values the transport already has.
+    Everything here runs on the D-Bus loop, so no locking is needed.
+    """
+
+    def __init__(self):
+        self.target = None # Newest requested 0-127 value
+        self.task = None
+        self.stats = {"requested": 0, "issued": 0, "coalesced": 0}
+
+    def request(self, bt_volume):
+        self.stats["requested"] += 1
+        if self.target is not None:
+            self.stats["coalesced"] += 1 # The pending value is replaced before it was sent
+        self.target = bt_volume
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self._flush())
+
+    async def _flush(self):
+        while self.target is not None:
+            bt_volume, self.target = self.target, None
+            try:
+                await self._write(bt_volume)
+            except Exception as e:
+                print(f"DBus Set Error: {e}")
+            # Let a held button pile up the next value instead of flooding the phone
+            await asyncio.sleep(VOLUME_WRITE_INTERVAL)
+
+    async def _write(self, bt_volume):
+        transport_path = await _find_transport_path()
+        if not transport_path:
+            return
+        # The index tracks the transport's Volume, including changes made on the phone,
+        # so this compares against the last value sent or seen
+        with _index_lock:
+            current = _objects.get(transport_path, {}).get(TRANSPORT_IFACE, {}).get("Volume")
+        if current == bt_volume:
+            self.stats["coalesced"] += 1
+            return
 
-        # Set the Volume
-        await props.call_set("org.bluez.MediaTransport1", "Volume", Variant('q', bt_volume))
+        # The proxy for the transport is cached, so this is a single Set call
+        props = await _get_properties(transport_path)
+        await props.call_set(TRANSPORT_IFACE, "Volume", Variant('q', bt_volume))
+        _index_update(transport_path, TRANSPORT_IFACE, {"Volume": bt_volume}, [])
+        self.stats["issued"] += 1
         print(f"Bluetooth Volume set to {bt_volume}/127 (path: {transport_path})")
-        
-    except Exception as e:
-        print(f"DBus Set Error: {e}")
-    finally:
-        # Close connection to free resources
-        bus.disconnect()
+
+_volume_writer = _VolumeWriter()
 
 async def _get_volume_async():
     """Async implementation of getting volume."""
-    bus = await _get_bus()
     try:
-        transport_path = await _find_transport_path(bus)
+        transport_path = await _find_transport_path()
         if not transport_path:
             return None
 
-        # Get Property
-        introspection = await bus.introspect("org.bluez", transport_path)
-        proxy = bus.get_proxy_object("org.bluez", transport_path, introspection)
-        props = proxy.get_interface("org.freedesktop.DBus.Properties")
-
         # Read Volume
-        bt_volume = await props.call_get("org.bluez.MediaTransport1", "Volume")
-        
+        props = await _get_properties(transport_path)
+        bt_volume = await props.call_get(TRANSPORT_IFACE, "Volume")
+
         # Convert back to percent (bt_volume is a Variant, .value gets the int)
         return int((bt_volume.value / 127) * 100)
 
     except Exception as e:
         print(f"DBus Get Error: {e}")
         return None
-    finally:
-        bus.disconnect()
-
-async def _get_connected_devices_async():
-    """Async scan for connected devices (No more subprocess!)."""
-    bus = await _get_bus()
-    connected_macs = []
-    try:
-        objects = await _get_bluez_objects(bus)
-        
-        for path, interfaces in objects.items():
-            # Check if it is a Device
-            if "org.bluez.Device1" in interfaces:
-                device_props = interfaces["org.bluez.Device1"]
-                
-                # Check 'Connected' property (It comes as a Variant)
-                is_connected = device_props.get("Connected", Variant('b', False)).value
-                
-                if is_connected:
-                    # The Address is also a property
-                    address = device_props.get("Address", Variant('s', "")).value
-                    if address:
-                        connected_macs.append(address)
-                        
-    except Exception as e:
-        print(f"DBus Device Scan Error: {e}")
-    finally:
-        bus.disconnect()
-        
-    return connected_macs
 
 async def _disconnect_device_async(mac_address):
     """Disconnects a device using DBus methods."""
-    bus = await _get_bus()
     try:
-        objects = await _get_bluez_objects(bus)
-        
-        for path, interfaces in objects.items():
-            if "org.bluez.Device1" in interfaces:
-                props = interfaces["org.bluez.Device1"]
-                addr = props.get("Address", Variant('s', "")).value
-                
-                # Found the target device
-                if addr == mac_address:
-                    print(f"Found device at {path}, disconnecting...")
-                    introspection = await bus.introspect("org.bluez", path)
-                    device = bus.get_proxy_object("org.bluez", path, introspection)
-                    interface = device.get_interface("org.bluez.Device1")
-                    
-                    await interface.call_disconnect()
-                    print(f"Disconnected {mac_address}")
-                    return
+        await _ensure_index()
+        with _index_lock:
+            path = _by_mac.get(mac_address)
+        if not path:
+            return
+
+        print(f"Found device at {path}, disconnecting...")
+        device = await _get_interface(path, DEVICE_IFACE)
+
+        await device.call_disconnect()
+        print(f"Disconnected {mac_address}")
 
     except Exception as e:
         print(f"DBus Disconnect Error: {e}")
-    finally:
-        bus.disconnect()
 
+async def _set_adapter_async(properties):
+    """Sets Adapter1 properties (Powered, Discoverable, Pairable) in the given order."""
+    await _ensure_index()
+    with _index_lock:
+        path = _adapter_path()
+    if not path:
+        print("DBus Adapter Error: No Bluetooth adapter found")
+        return
+
+    props = await _get_properties(path)
+    for name, value in properties:
+        await props.call_set(ADAPTER_IFACE, name, Variant('b', value))
+
+async def _disconnect_all_async():
+    """Disconnects every connected device."""
+    await _ensure_index()
+    with _index_lock:
+        connected = _connected_devices()
+    for mac in connected:
+        await _disconnect_device_async(mac)
 
 # Synchronous wrappers
+# These hand the coroutine to the shared loop thread and wait for the result,
+# so they are safe to call from any thread.
 
+def _run(coro, fallback=None):
+    try:
+        return dbus_loop.run(coro)
+    except Exception as e:
+        print(f"DBus Error: {e}")
+        return fallback
+
+@tracing.traced("bluetooth.set_volume")
 def set_bluetooth_volume(volume_percent):
-    """Sets volume of current transport (0-100)."""
-    asyncio.run(_set_volume_async(volume_percent))
+    """
+    Sets volume of current transport (0-100).
+    Returns immediately; bursts are collapsed so only the newest value is written.
+    """
+    # Convert 0-100 to 0-127 (BlueZ uint16 scale)
+    vol_clamped = max(0, min(100, volume_percent))
+    bt_volume = int((vol_clamped / 100) * 127)
+    dbus_loop.get_loop().call_soon_threadsafe(_volume_writer.request, bt_volume)
+
+def get_volume_writer_stats():
+    """Counters for Bluetooth volume writes: requested, issued and coalesced."""
+    return dict(_volume_writer.stats)
+
+metrics.register_collector(
+    "nexo_bluetooth_volume_writes_total", "Bluetooth volume writes requested, issued and coalesced",
+    get_volume_writer_stats, kind="counter", label="result",
+)
 
 def get_bluetooth_volume():
     """Gets volume of current transport (0-100). Returns None if not playing."""
-    return asyncio.run(_get_volume_async())
+    return _run(_get_volume_async())
 
 def get_connected_devices():
     """Returns list of MAC addresses of currently connected devices."""
-    return asyncio.run(_get_connected_devices_async())
+    try:
+        return _lookup(_connected_devices)
+    except Exception as e:
+        print(f"DBus Device Scan Error: {e}")
+        return []
 
 def disconnect_device(mac_address):
     """Force disconnects a specific MAC address."""
-    asyncio.run(_disconnect_device_async(mac_address))
\ No newline at end of file
+    _run(_disconnect_device_async(mac_address))
+
+def get_track_info():
+    """
+    Returns a dictionary with the connected phone's current track details.
+    """
+    info = {
+        "title": "Unknown Title",
+        "artist": "Unknown Artist",
+        "album": "Unknown Album",
+        "image_url": "",
+        "duration_sec": 0,
+        "position_sec": 0,
+        "status": None, # AVRCP status: "playing", "paused", "stopped"...
+    }
+
+    try:
+        player = _lookup(_player_properties)
+    except Exception as e:
+        print(f"DBus Player Error: {e}")
+        return info
+    if not player:
+        return info
+
+    # Track is a{sv}, AVRCP times are in milliseconds
+    track = _unwrap(player.get("Track", {}))
+    info["title"] = track.get("Title", info["title"])
+    info["artist"] = track.get("Artist", info["artist"])
+    info["album"] = track.get("Album", info["album"])
+    info["duration_sec"] = track.get("Duration", 0) / 1000
+    info["position_sec"] = player.get("Position", 0) / 1000
+    info["status"] = player.get("Status")
+
+    return info
+
+def add_connection_listener(callback):
+    """
+    Registers callback(mac, connected) for Device1.Connected changes.
+    Runs on the D-Bus dispatcher thread within a bus round-trip of the change.
+    """
+    _connection_listeners.append(callback)
+    try:
+        dbus_loop.run(_ensure_index())
+    except Exception as e:
+        print(f"DBus Subscribe Error: {e}") # The next lookup will retry
+
+def set_adapter_properties(powered=None, discoverable=None, pairable=None):
+    """Sets the adapter's Powered/Discoverable/Pairable flags directly on org.bluez.Adapter1."""
+    properties = [
+        (name, value)
+        for name, value in (("Powered", powered), ("Discoverable", discoverable), ("Pairable", pairable))
+        if value is not None
+    ]
+    _run(_set_adapter_async(properties))
+
+def disconnect_all():
+    """Force disconnects every connected device."""
+    _run(_disconnect_all_async())
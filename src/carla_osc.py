@@ -1,4 +1,10 @@
-from pythonosc import udp_client
+from threading import Lock, Condition, Thread
+from time import monotonic
+from pythonosc import udp_client, osc_bundle_builder, osc_message_builder
+
+import metrics
+import tracing
+from state_hub import StateHub
 
 # Config
 IP = "127.0.0.1"
@@ -6,6 +12,9 @@ PORT = 22752  # Default Carla OSC port
 
 client = udp_client.SimpleUDPClient(IP, PORT)
 
+SHADOW_TOLERANCE = 0.0005 # Changes smaller than this are not worth a packet
+RAMP_RATE = 50 # Control rate (Hz) for parameter ramps
+
 # Constants
 
 # Plugin IDs
@@ -37,19 +46,239 @@ EQ_BANDS = {
     16000: 74
 }
 
+# Shadow table
+# Remembers the last value sent for every (plugin_id, param_id), so repeated
+# updates (e.g. the loudness contour clamped at 0.5 above volume 80) are not resent.
+_shadow = {}
+_shadow_lock = Lock()
+_shadow_version = 0 # Bumped whenever a shadowed value changes, so readers can cache on it
+_stats = {"sent": 0, "suppressed": 0}
+
+# Publishes shadow_version, so long-polls on DSP state (/control/eq) wake on changes
+# that never go through the controller's hub, e.g. a delayed loudness ramp
+dsp_hub = StateHub()
+
+def _bump_shadow_version():
+    """Marks the shadow table as changed (caller holds _shadow_lock)."""
+    global _shadow_version
+    _shadow_version += 1
+    dsp_hub.publish(shadow_version=_shadow_version)
+
+def _changed_parameters(params):
+    """Filters params down to the ones that differ from the shadow table, and records them."""
+    changed = []
+    with _shadow_lock:
+        for plugin_id, param_id, value in params:
+            key = (int(plugin_id), int(param_id))
+            last = _shadow.get(key)
+            if last is not None and abs(last - float(value)) <= SHADOW_TOLERANCE:
+                _stats["suppressed"] += 1
+                continue
+            _shadow[key] = float(value)
+            changed.append((plugin_id, param_id, value))
+        _stats["sent"] += len(changed)
+        if changed:
+            _bump_shadow_version()
+    return changed
+
+def _forget_parameters(params):
+    """Drops params from the shadow table, so a failed send is retried next time."""
+    with _shadow_lock:
+        for plugin_id, param_id, _ in params:
+            _shadow.pop((int(plugin_id), int(param_id)), None)
+        _bump_shadow_version()
+
+def get_parameter(plugin_id, param_id):
+    """Returns the last value sent to a parameter, or None if it was never set."""
+    with _shadow_lock:
+        return _shadow.get((plugin_id, param_id))
+
+def get_eq_state(plugin_id=PLUGIN_EQ):
+    """Returns {freq: value} for every EQ band of a plugin that has been set."""
+    with _shadow_lock:
+        return {
+            freq: _shadow[(plugin_id, param_id)]
+            for freq, param_id in EQ_BANDS.items()
+            if (plugin_id, param_id) in _shadow
+        }
+
+def get_osc_stats():
+    """Counters for parameter updates: sent and suppressed as duplicates."""
+    with _shadow_lock:
+        return dict(_stats)
+
+def get_shadow_version():
+    """Increases whenever the recorded DSP state changes."""
+    return _shadow_version
+
+metrics.register_collector(
+    "nexo_osc_parameters_total", "Parameter updates sent to Carla or suppressed as duplicates",
+    get_osc_stats, kind="counter", label="result",
+)
+
+def clear_shadow():
+    """Forgets what was sent, so every value goes out again (startup does this once Carla is linked)."""
+    with _shadow_lock:
+        _shadow.clear()
+        _bump_shadow_version()
+
 # Functions
 
+# Held while a value is decided and sent, by explicit sends and by ramp steps alike,
+# so a ramp step computed before an explicit value can't go out after it
+_send_lock = Lock()
+
 def _send_carla_command(plugin_id, param_id, value):
     """
     Sends the OSC command: /Carla/<plugin_id>/set_parameter_value <param_id> <value>
     """
+    with _send_lock:
+        _cancel_ramps([(plugin_id, param_id, value)]) # An explicit value wins over a ramp in progress
+        if not _changed_parameters([(plugin_id, param_id, value)]):
+            return
+        _send_message(plugin_id, param_id, value)
+
+def _send_message(plugin_id, param_id, value):
     address = f"/Carla/{plugin_id}/set_parameter_value"
     try:
         # Arguments: Parameter ID (int), Value (float)
-        client.send_message(address, [int(param_id), float(value)])
+        with tracing.span("osc.send", address=address):
+            client.send_message(address, [int(param_id), float(value)])
+        metrics.osc_datagrams.inc(kind="message")
     except Exception as e:
+        _forget_parameters([(plugin_id, param_id, value)])
+        metrics.osc_send_failures.inc()
         print(f"OSC Error: {e}")
 
+def send_parameters(params):
+    """
+    Sends several parameter changes as ONE OSC bundle, so Carla applies them together
+    instead of spreading them over several audio periods.
+    Parameters already at the requested value are left out.
+    params: iterable of (plugin_id, param_id, value)
+    """
+    params = list(params)
+    with _send_lock:
+        _cancel_ramps(params) # An explicit value wins over a ramp in progress
+        _send_bundle(params)
+
+def _send_bundle(params):
+    """Sends the params that differ from the shadow table as one bundle (caller holds _send_lock)."""
+    params = _changed_parameters(params)
+    if not params:
+        return
+
+    bundle = osc_bundle_builder.OscBundleBuilder(osc_bundle_builder.IMMEDIATELY)
+    for plugin_id, param_id, value in params:
+        msg = osc_message_builder.OscMessageBuilder(address=f"/Carla/{plugin_id}/set_parameter_value")
+        msg.add_arg(int(param_id))
+        msg.add_arg(float(value))
+        bundle.add_content(msg.build())
+
+    try:
+        with tracing.span("osc.send_bundle", messages=len(params)):
+            client.send(bundle.build())
+        metrics.osc_datagrams.inc(kind="bundle")
+    except Exception as e:
+        _forget_parameters(params)
+        metrics.osc_send_failures.inc()
+        print(f"OSC Error: {e}")
+
+# Ramp scheduler
+# One worker thread interpolates parameters towards their targets at RAMP_RATE,
+# sending each step as a single bundle. A new target for a parameter replaces
+# the ramp in progress and starts from wherever that ramp had got to.
+_ramps = {} # (plugin_id, param_id) -> {"target", "begin", "duration", "start"}
+_ramp_cond = Condition()
+_ramp_thread = None
+_ramps_changed = False # Set by ramp_parameters so a new target never waits out a sleep
+
+def ramp_parameters(params, duration, delay=0.0):
+    """
+    Moves parameters to new values over `duration` seconds, starting after `delay` seconds.
+    Returns immediately; the ramp runs on the scheduler thread.
+    params: iterable of (plugin_id, param_id, target value)
+    """
+    global _ramp_thread, _ramps_changed
+    begin = monotonic() + delay
+    with _ramp_cond:
+        for plugin_id, param_id, value in params:
+            _ramps[(int(plugin_id), int(param_id))] = {
+                "target": float(value),
+                "begin": begin,
+                "duration": max(0.0, duration),
+                "start": None, # Read from the shadow table when the ramp begins
+            }
+        if _ramp_thread is None:
+            _ramp_thread = Thread(target=_ramp_worker, name="carla-ramps", daemon=True)
+            _ramp_thread.start()
+        _ramps_changed = True
+        _ramp_cond.notify()
+
+def _cancel_ramps(params):
+    with _ramp_cond:
+        for plugin_id, param_id, _ in params:
+            _ramps.pop((int(plugin_id), int(param_id)), None)
+
+def _ramp_step(now):
+    """Advances every started ramp to `now`. Returns (params to send, seconds until the next step)."""
+    params = []
+    next_begin = None
+    for key, ramp in list(_ramps.items()):
+        if ramp["begin"] > now:
+            wait = ramp["begin"] - now
+            next_begin = wait if next_begin is None else min(next_begin, wait)
+            continue
+
+        if ramp["start"] is None:
+            current = get_parameter(*key)
+            ramp["start"] = ramp["target"] if current is None else current
+
+        elapsed = now - ramp["begin"]
+        progress = 1.0 if ramp["duration"] == 0 else min(1.0, elapsed / ramp["duration"])
+        params.append((*key, ramp["start"] + (ramp["target"] - ramp["start"]) * progress))
+        if progress >= 1.0:
+            del _ramps[key]
+
+    if any(ramp["start"] is not None for ramp in _ramps.values()):
+        return params, 1.0 / RAMP_RATE
+    return params, next_begin
+
+def _ramp_worker():
+    global _ramps_changed
+    while True:
+        with _send_lock:
+            with _ramp_cond:
+                _ramps_changed = False
+                params, wait = _ramp_step(monotonic())
+            if params:
+                _send_bundle(params)
+        with _ramp_cond:
+            # Sleep until the next step, the next delayed ramp, or a new target
+            if not _ramps_changed:
+                _ramp_cond.wait(timeout=wait)
+
+def eq_parameters(plugin_id, gains):
+    """
+    Turns {freq: gain} into (plugin_id, param_id, gain) tuples for send_parameters.
+    Unknown frequencies are reported and skipped.
+    """
+    params = []
+    for freq, gain in gains.items():
+        if freq not in EQ_BANDS:
+            print(f"Error: Frequency {freq}Hz not found in EQ map.")
+            continue
+        params.append((plugin_id, EQ_BANDS[freq], gain))
+    return params
+
+def set_eq_gains(gains):
+    """
+    Sets several bands of the main EQ in one bundle.
+    gains: A dictionary mapping frequency (Hz) to gain value.
+    """
+    send_parameters(eq_parameters(PLUGIN_EQ, gains))
+    print(f"EQ: Set {gains}")
+
 def set_eq_gain(freq, gain_val):
     """
     Sets the gain for a specific frequency band.
@@ -71,32 +300,45 @@ def set_splitter_volume(splitter_num, volume_db):
     splitter_num: 1 or 2
     volume_db: The value (XML default shows -12 or 0)
     """
-    if splitter_num == 1:
-        plugin_id = WOOFER_SPLITTER
-    elif splitter_num == 2:
-        plugin_id = OTHER_SPLITTER
-    else:
-        print("Error: Invalid splitter number (use 1 or 2)")
-        return
+    set_splitter_volumes({splitter_num: volume_db})
+
+def set_splitter_volumes(volumes):
+    """
+    Sets the Master volume of both splitters in one bundle.
+    volumes: A dictionary mapping splitter number (1 or 2) to value.
+    """
+    params = []
+    for splitter_num, volume_db in volumes.items():
+        if splitter_num == 1:
+            plugin_id = WOOFER_SPLITTER
+        elif splitter_num == 2:
+            plugin_id = OTHER_SPLITTER
+        else:
+            print("Error: Invalid splitter number (use 1 or 2)")
+            continue
+        params.append((plugin_id, PARAM_SPLITTER_MASTER, volume_db))
 
-    _send_carla_command(plugin_id, PARAM_SPLITTER_MASTER, volume_db)
-    print(f"Splitter {splitter_num}: Master set to {volume_db}")
+    send_parameters(params)
+    for splitter_num, volume_db in volumes.items():
+        print(f"Splitter {splitter_num}: Master set to {volume_db}")
 
 # Reset EQ to flat
 def reset_eq_flat():
     print("Resetting EQ to flat (1.0)...")
-    for freq in EQ_BANDS:
-        set_eq_gain(freq, 0.0)
+    set_eq_gains({freq: 0.0 for freq in EQ_BANDS})
 
 def set_loudness_contour_eq(eq_settings):
     """
     Sets the EQ settings for the Loudness Contour EQ.
     eq_settings: A dictionary mapping frequency (Hz) to gain value.
     """
-    for freq, gain in eq_settings.items():
-        if freq not in EQ_BANDS:
-            print(f"Error: Frequency {freq}Hz not found in EQ map.")
-            continue
-        param_id = EQ_BANDS[freq]
-        _send_carla_command(LOUDNESS_EQ, param_id, gain)
-        print(f"Loudness Contour EQ: Set {freq}Hz to {gain}")
\ No newline at end of file
+    send_parameters(eq_parameters(LOUDNESS_EQ, eq_settings))
+    print(f"Loudness Contour EQ: Set {eq_settings}")
+
+def ramp_loudness_contour_eq(eq_settings, duration, delay=0.0):
+    """
+    Ramps the Loudness Contour EQ to new settings (see ramp_parameters).
+    eq_settings: A dictionary mapping frequency (Hz) to gain value.
+    """
+    ramp_parameters(eq_parameters(LOUDNESS_EQ, eq_settings), duration, delay)
+    print(f"Loudness Contour EQ: Ramping to {eq_settings} over {duration}s after {delay}s")
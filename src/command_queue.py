@@ -0,0 +1,128 @@
+import asyncio
+import uuid
+from collections import OrderedDict
+from queue import Queue
+from threading import Thread, Lock
+from time import time
+
+import tracing
+
+# Command queues for the API.
+# Handlers submit work (media actions, EQ presets, Wi-Fi scans...) and answer
+# right away with a command id; a worker thread per queue runs the commands in
+# order, and /commands/{id} reports how they went. Slow lanes (nmcli) get
+# their own queue so they never hold up playback controls.
+
+MAX_HISTORY = 256 # Finished commands kept for /commands/{id}
+
+_commands = OrderedDict() # id -> command record, shared by every queue
+_waiters = {} # id -> [(loop, future)] waiting for that command to finish
+_lock = Lock()
+
+class CommandQueue:
+    def __init__(self, name):
+        self.name = name
+        self._queue = Queue()
+        self._thread = None
+        self._start_lock = Lock()
+
+    def submit(self, name, fn, *args, **kwargs):
+        """Queues fn(*args, **kwargs) and returns its command id."""
+        cmd_id = uuid.uuid4().hex[:12]
+        context = tracing.current()
+        record = {
+            "id": cmd_id,
+            "name": name,
+            "queue": self.name,
+            "status": "queued",
+            "submitted_at": round(time(), 3),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+            "trace_id": context[0] if context else None,
+        }
+        with _lock:
+            _commands[cmd_id] = record
+            # Forget the oldest finished commands
+            while len(_commands) > MAX_HISTORY:
+                oldest_id, oldest = next(iter(_commands.items()))
+                if oldest["status"] in ("queued", "running"):
+                    break
+                del _commands[oldest_id]
+
+        self._ensure_worker()
+        self._queue.put((record, fn, args, kwargs, context, tracing.now()))
+        return cmd_id
+
+    def depth(self):
+        """Commands waiting to run."""
+        return self._queue.qsize()
+
+    def _ensure_worker(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name=f"commands-{self.name}", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            record, fn, args, kwargs, context, queued_at = self._queue.get()
+            _update(record, status="running", started_at=round(time(), 3))
+            tracing.record("command.queued", context, queued_at, queue=self.name)
+            try:
+                with tracing.attach(context), tracing.span(f"command.{record['name']}", command_id=record["id"]):
+                    result = fn(*args, **kwargs)
+                _update(record, status="done", result=result, finished_at=round(time(), 3))
+            except Exception as e:
+                print(f"Command Error ({record['name']}): {e}")
+                _update(record, status="failed", error=str(e), finished_at=round(time(), 3))
+
+def _update(record, **changes):
+    with _lock:
+        record.update(changes)
+        finished = record["status"] in ("done", "failed")
+        waiters = _waiters.pop(record["id"], []) if finished else []
+        snapshot = dict(record)
+
+    for loop, future in waiters:
+        try:
+            loop.call_soon_threadsafe(_resolve, future, snapshot)
+        except RuntimeError:
+            pass # Loop already closed
+
+def _resolve(future, record):
+    if not future.done():
+        future.set_result(record)
+
+def get_command(cmd_id):
+    """Returns a copy of the command record, or None if it is unknown (or too old)."""
+    with _lock:
+        record = _commands.get(cmd_id)
+        return dict(record) if record is not None else None
+
+async def wait_for(cmd_id, timeout=None):
+    """
+    Waits (without a thread) until the command finished, or timeout seconds.
+    Returns the command record as it is then, or None if it is unknown.
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        record = _commands.get(cmd_id)
+        if record is None:
+            return None
+        if record["status"] in ("done", "failed"):
+            return dict(record)
+        future = loop.create_future()
+        _waiters.setdefault(cmd_id, []).append((loop, future))
+
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        with _lock:
+            pending = _waiters.get(cmd_id, [])
+            if (loop, future) in pending:
+                pending.remove((loop, future))
+            if not pending:
+                _waiters.pop(cmd_id, None)
+        return get_command(cmd_id)
@@ -1,19 +1,33 @@
+import atexit
+import copy
 import json
 import os
+import signal
 import uuid
+from collections import deque
+from threading import Thread, Condition, Lock, RLock, current_thread, main_thread
+from time import monotonic
+import metrics
 import system_helper as system
 from pathlib import Path
+from types import MappingProxyType
 
-CONFIG_FILE = Path(__file__).resolve().parent.parent / "assets" / "config" / "nexo_config.json"
+CONFIG_FILE = Path(os.environ.get(
+    "NEXO_CONFIG_FILE", Path(__file__).resolve().parent.parent / "assets" / "config" / "nexo_config.json",
+)) # Overridable, so several API instances can run side by side (e.g. to test a group)
+FLUSH_INTERVAL = 5.0 # Seconds a change may sit in memory before it is written (write-behind mode)
+JOURNAL_COMPACT_SIZE = 64 * 1024 # Bytes of journal before it is folded into a new snapshot
+CONFIG_BACKEND = os.environ.get("NEXO_CONFIG_BACKEND", "json") # "json" (whole file) or "journal"
 DEFAULT_CONFIG = {
     "device_name": "Nexo Home",
-    "device_id": uuid.uuid4().hex,
+    "device_id": "", # Per-device values are filled in by build_default_config()
     "volume": 100,
     "max_volume": 55,
     "root_path": str(Path(__file__).resolve().parent.parent),
     "sounds": True,
+    "spotify_backend": "mpris", # "mpris" (D-Bus) or "playerctl" (subprocess)
     "wifi": {
-        "ssid": system.get_current_wifi_ssid() or "",
+        "ssid": "",
         "password": ""
     },
     "eq_presets": {
@@ -39,57 +53,394 @@ DEFAULT_CONFIG = {
     },
     "current_eq_bass": 0,
     "current_eq_treble": 0,
+    "scenes": {}, # name -> list of /control/batch operations
+    "group": {}, # peer name -> {"url", "timeout"} of the other Nexos this master controls
     "master": True
 }
 
+def build_default_config():
+    """
+    Returns a fresh default config, with a new device id and the Wi-Fi network we're on.
+    Only called when there is no usable config file, so importing this module never forks iwgetid.
+    """
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    config["device_id"] = uuid.uuid4().hex
+    config["wifi"]["ssid"] = system.get_current_wifi_ssid() or ""
+    return config
+
 class DataHandler:
-    def __init__(self, filepath=CONFIG_FILE):
+    """
+    JSON config store, safe to share between threads.
+    Every write publishes a new read-only snapshot with a higher version, so readers
+    never lock and never see a half-applied change; writers are serialized.
+    In write-behind mode (the default) set() only updates memory; a flusher thread
+    writes the file at most every flush_interval seconds, and at exit or SIGTERM.
+    """
+
+    def __init__(self, filepath=CONFIG_FILE, write_behind=True, flush_interval=FLUSH_INTERVAL):
         self.filepath = filepath
-        self.data = self._load_data()
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self._cond = Condition()
+        self._io_lock = Lock() # Keeps disk writes in the order their changes were made
+        self._dirty_keys = set()
+        self._flusher = None
+        self._started = monotonic()
+        self._writes = deque() # (timestamp, bytes) of the writes in the last hour
+        self.stats = {"sets": 0, "unchanged": 0, "flushes": 0, "bytes_written": 0}
+        self._listeners = []
+        self._notify_lock = RLock() # One delivery at a time; reentrant so a listener may set() too
+        self._pending = deque() # (version, changed) waiting for the listeners, in version order
+        self._state = (0, MappingProxyType(self._load_data())) # (version, snapshot), swapped as one
+        self._json = (None, b"") # (version, get_json() body)
+        if write_behind:
+            self._install_shutdown_hooks()
 
     def _load_data(self):
         """Loads JSON from disk or creates default if missing."""
         if not self.filepath.exists():
             print(f"Config file not found. Creating default at {self.filepath}")
-            self._save_to_disk(DEFAULT_CONFIG)
-            return DEFAULT_CONFIG.copy()
+            config = build_default_config()
+            self._save_to_disk(config)
+            return config
         
         try:
             with open(self.filepath, 'r') as f:
                 return json.load(f)
         except (json.JSONDecodeError, IOError) as e:
             print(f"Error loading config: {e}. Reverting to default.")
-            return DEFAULT_CONFIG.copy()
+            return build_default_config()
 
     def _save_to_disk(self, data):
-        """Atomic write: Write to temp, then rename."""
+        self._write_payload(json.dumps(data, indent=4))
+
+    def _fsync_dir(self):
+        """Makes renames and new files in the config directory survive a power cut."""
+        dir_fd = os.open(self.filepath.parent, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    def _write_payload(self, payload):
+        """Atomic, durable write: write to temp, fsync, rename, fsync the directory."""
         temp_file = self.filepath.with_suffix(self.filepath.suffix + ".tmp")
         try:
             with open(temp_file, 'w') as f:
-                json.dump(data, f, indent=4)
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
             
             # Atomic move
             os.replace(temp_file, self.filepath)
+
+            self._fsync_dir()
+
+            self._record_write(len(payload.encode()))
         except Exception as e:
             print(f"Failed to save config: {e}")
 
+    def _record_write(self, size):
+        now = monotonic()
+        with self._cond:
+            self.stats["flushes"] += 1
+            self.stats["bytes_written"] += size
+            self._writes.append((now, size))
+            while self._writes and now - self._writes[0][0] > 3600:
+                self._writes.popleft()
+
+    # Write-behind
+
+    def _mark_dirty(self):
+        """Schedules a flush (must hold self._cond)."""
+        if self._flusher is None:
+            self._flusher = Thread(target=self._flush_loop, name="config-flusher", daemon=True)
+            self._flusher.start()
+        self._cond.notify()
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while not self._dirty_keys:
+                    self._cond.wait()
+                # Let a burst of changes (a held volume button) land in one write.
+                # The first change starts the clock; later ones wake us but don't move the deadline
+                deadline = monotonic() + self.flush_interval
+                while self._dirty_keys:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            self.flush()
+
+    def flush(self):
+        """Writes pending changes to disk now. Cheap when nothing changed."""
+        with self._io_lock:
+            with self._cond:
+                if not self._dirty_keys:
+                    return
+                keys, self._dirty_keys = self._dirty_keys, set()
+                payload = self._encode_changes(keys) # Serialized under the lock, written outside it
+            self._write_changes(payload)
+
+    def _encode_changes(self, keys):
+        """Serializes what a flush writes (called with self._cond held). The JSON backend writes everything."""
+        return self._serialize()
+
+    def _serialize(self):
+        return json.dumps(dict(self.data), indent=4)
+
+    def _write_changes(self, payload):
+        self._write_payload(payload)
+
+    def close(self):
+        """Writes everything out before the process exits."""
+        self.flush()
+
+    def _install_shutdown_hooks(self):
+        atexit.register(self.close)
+        # Signal handlers can only be installed from the main thread
+        if current_thread() is not main_thread():
+            return
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def on_sigterm(signum, frame):
+            self.close()
+            if callable(previous):
+                previous(signum, frame)
+            else:
+                raise SystemExit(0)
+
+        signal.signal(signal.SIGTERM, on_sigterm)
+
+    # Snapshots
+
+    @property
+    def data(self):
+        """The current read-only snapshot. Nested values are shared, treat them as read-only too."""
+        return self._state[1]
+
+    @property
+    def version(self):
+        """Increases with every change, so callers can tell whether anything moved."""
+        return self._state[0]
+
+    def snapshot(self):
+        """Returns (version, read-only snapshot) from the same instant."""
+        return self._state
+
     def get(self, key, default=None):
         """Get a specific setting."""
-        return self.data.get(key, default)
+        return self._state[1].get(key, default)
 
     def set(self, key, value):
-        """Update a specific setting and save to disk."""
-        self.data[key] = value
-        self._save_to_disk(self.data)
-        return self.data[key]
+        """Update a specific setting and save it (immediately, or on the next flush in write-behind mode)."""
+        self.update({key: value})
+        return value
+
+    def update(self, changes):
+        """Applies several settings as one change (one version, one flush). Returns the new version."""
+        with self._cond:
+            version, data = self._state
+            self.stats["sets"] += len(changes)
+            changed = {}
+            for key, value in changes.items():
+                if key in data and data[key] == value:
+                    self.stats["unchanged"] += 1
+                    continue
+                changed[key] = copy.deepcopy(value) # The snapshot must not share objects with the caller
+            if not changed:
+                return version
+
+            version += 1
+            self._state = (version, MappingProxyType({**data, **changed}))
+            self._dirty_keys.update(changed)
+            if self.write_behind:
+                self._mark_dirty()
+            self._pending.append((version, changed))
+
+        if not self.write_behind:
+            self.flush()
+        self._notify()
+        return version
 
     def get_all(self):
-        return self.data
+        """Returns the current read-only snapshot."""
+        return self._state[1]
+
+    def get_json(self):
+        """The current snapshot as JSON bytes, serialized once per version."""
+        version, data = self._state
+        cached_version, body = self._json
+        if cached_version != version:
+            body = json.dumps(dict(data)).encode()
+            self._json = (version, body)
+        return body
     
     def reset_to_default(self):
         """Resets the config file to default settings."""
-        self.data = DEFAULT_CONFIG.copy()
-        self._save_to_disk(self.data)
+        with self._io_lock:
+            with self._cond:
+                version = self._state[0] + 1
+                self._state = (version, MappingProxyType(build_default_config()))
+                self._dirty_keys = set()
+                self._pending.append((version, dict(self.data)))
+                payload = self._serialize()
+            self._write_payload(payload)
+        self._notify()
+
+    # Listeners
+
+    def add_listener(self, callback):
+        """Registers callback(version, changed) for every change, delivered in version order on a writer's thread."""
+        self._listeners.append(callback)
+
+    def _notify(self):
+        """
+        Delivers queued changes to the listeners.
+        Writers queue under the lock but deliver outside it, so two writers could
+        otherwise hand their versions over in the wrong order.
+        """
+        with self._notify_lock:
+            while True:
+                with self._cond:
+                    if not self._pending:
+                        return
+                    version, changed = self._pending.popleft()
+                for callback in self._listeners:
+                    try:
+                        callback(version, changed)
+                    except Exception as e:
+                        print(f"Config Listener Error: {e}")
+
+    def get_write_stats(self):
+        """Counters for config writes, including bytes written in the last hour."""
+        now = monotonic()
+        with self._cond:
+            while self._writes and now - self._writes[0][0] > 3600:
+                self._writes.popleft()
+            stats = dict(self.stats)
+            stats["bytes_last_hour"] = sum(size for _, size in self._writes)
+            stats["dirty_keys"] = sorted(self._dirty_keys)
+        hours = max((now - self._started) / 3600, 1 / 60) # Avoid a huge rate in the first seconds
+        stats["bytes_per_hour"] = round(stats["bytes_written"] / hours)
+        return stats
+
+class JournaledDataHandler(DataHandler):
+    """
+    Config store that appends changed keys to a journal, one JSON record per line,
+    instead of rewriting the whole file. Loading replays the journal over the last
+    snapshot (the regular config file); once the journal passes compact_size it is
+    folded into a new snapshot and emptied.
+    """
+
+    def __init__(self, filepath=CONFIG_FILE, compact_size=JOURNAL_COMPACT_SIZE, **kwargs):
+        self.journal_path = filepath.with_suffix(".journal")
+        self.compact_size = compact_size
+        self._journal_size = 0
+        super().__init__(filepath, **kwargs)
+
+    def _load_data(self):
+        """Loads the snapshot, then replays the journal over it."""
+        data = super()._load_data()
+        replayed = 0
+        torn = False
+        try:
+            with open(self.journal_path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        data[record["k"]] = record["v"]
+                        replayed += 1
+                    except (json.JSONDecodeError, KeyError, TypeError):
+                        torn = True # Crash mid-append; only the last record can be affected
+                        break
+            self._journal_size = self.journal_path.stat().st_size
+        except FileNotFoundError:
+            pass
+        except IOError as e:
+            print(f"Error reading config journal: {e}")
+
+        if replayed:
+            print(f"Replayed {replayed} config journal records")
+        # A torn tail would corrupt the next append, so start from a clean snapshot
+        if torn or self._journal_size > self.compact_size:
+            self._compact(json.dumps(data, indent=4))
+        return data
+
+    def _encode_changes(self, keys):
+        return "".join(
+            json.dumps({"k": key, "v": self.data[key]}, separators=(",", ":")) + "\n"
+            for key in keys if key in self.data
+        )
+
+    def _write_changes(self, payload):
+        try:
+            is_new = not self.journal_path.exists()
+            with open(self.journal_path, 'a') as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            if is_new:
+                self._fsync_dir()
+            size = len(payload.encode())
+            self._journal_size += size
+            self._record_write(size)
+        except Exception as e:
+            print(f"Failed to append to config journal: {e}")
+            return
+
+        if self._journal_size > self.compact_size:
+            with self._cond:
+                snapshot = self._serialize()
+            self._compact(snapshot)
+
+    def _compact(self, snapshot):
+        """
+        Writes the serialized snapshot, then empties the journal (caller holds self._io_lock, or is loading).
+        A crash in between just replays records the snapshot already contains.
+        """
+        self._write_payload(snapshot)
+        self._truncate_journal()
+
+    def _truncate_journal(self):
+        try:
+            with open(self.journal_path, 'w') as f:
+                os.fsync(f.fileno())
+            self._journal_size = 0
+        except Exception as e:
+            print(f"Failed to truncate config journal: {e}")
+
+    def close(self):
+        """Flushes and compacts, so the plain config file is complete after a clean shutdown."""
+        self.flush()
+        with self._io_lock:
+            if self._journal_size:
+                with self._cond:
+                    snapshot = self._serialize()
+                self._compact(snapshot)
+
+    def reset_to_default(self):
+        """Resets to default settings. The journal goes first, so a crash leaves the old config, not a mix."""
+        with self._io_lock:
+            self._truncate_journal()
+            with self._cond:
+                version = self._state[0] + 1
+                self._state = (version, MappingProxyType(build_default_config()))
+                self._dirty_keys = set()
+                self._pending.append((version, dict(self.data)))
+                payload = self._serialize()
+            self._write_payload(payload)
+        self._notify()
 
 # Create a singleton instance to be shared across modules
-db = DataHandler()
\ No newline at end of file
+db = JournaledDataHandler() if CONFIG_BACKEND == "journal" else DataHandler()
+
+metrics.register_collector(
+    "nexo_config_writes_total", "Config store counters: sets, unchanged sets, flushes and bytes written",
+    lambda: dict(db.stats), kind="counter", label="stat",
+)
+metrics.register_collector(
+    "nexo_config_dirty_keys", "Changed config keys waiting for the next flush",
+    lambda: len(db._dirty_keys),
+)
\ No newline at end of file
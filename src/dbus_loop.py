@@ -0,0 +1,79 @@
+import asyncio
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from queue import Queue
+from threading import Thread, Lock, get_ident
+from time import perf_counter
+
+import metrics
+import tracing
+
+# One asyncio loop for every D-Bus connection in the process.
+# It runs in its own daemon thread, so the sync helpers can hand it
+# coroutines from GPIO callbacks, worker threads and the API threadpool.
+
+DEFAULT_TIMEOUT = 5.0 # Seconds to wait for a D-Bus call before giving up
+
+_loop = None
+_loop_thread_id = None
+_lock = Lock()
+
+def _run_loop(loop):
+    global _loop_thread_id
+    _loop_thread_id = get_ident()
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
+
+def get_loop():
+    """Returns the shared D-Bus event loop, starting its thread on first use."""
+    global _loop
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            Thread(target=_run_loop, args=(loop,), name="dbus-loop", daemon=True).start()
+            _loop = loop
+    return _loop
+
+def run(coro, timeout=DEFAULT_TIMEOUT):
+    """
+    Runs a coroutine on the shared loop and blocks until it finishes.
+    Safe to call from any thread except the loop thread itself.
+    """
+    loop = get_loop()
+    if get_ident() == _loop_thread_id:
+        coro.close()
+        raise RuntimeError("dbus_loop.run() called from the D-Bus loop thread")
+
+    call = coro.__name__
+    start = perf_counter()
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+    try:
+        with tracing.span("dbus", call=call):
+            return future.result(timeout)
+    except FutureTimeoutError:
+        future.cancel()
+        raise
+    finally:
+        metrics.dbus_call_seconds.observe(perf_counter() - start, call=call)
+
+# Signal callbacks are handed to a separate thread so they can block
+# (file writes, GPIO, even sync D-Bus calls) without stalling the loop.
+
+_events = Queue()
+_dispatcher = None
+
+def _dispatch_events():
+    while True:
+        callback, args = _events.get()
+        try:
+            callback(*args)
+        except Exception as e:
+            print(f"D-Bus Callback Error: {e}")
+
+def dispatch(callback, *args):
+    """Queues callback(*args) to run on the D-Bus event dispatcher thread."""
+    global _dispatcher
+    with _lock:
+        if _dispatcher is None:
+            _dispatcher = Thread(target=_dispatch_events, name="dbus-events", daemon=True)
+            _dispatcher.start()
+    _events.put((callback, args))
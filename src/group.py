@@ -0,0 +1,131 @@
+import asyncio
+from threading import Lock
+from time import perf_counter
+
+import httpx
+
+import metrics
+import tracing
+from data_handler import db
+
+# Multi-room group coordinator (runs on the master).
+# Peers are other Nexos, stored in the "group" config key as
+# {name: {"url": "http://<host>:<port>", "timeout": seconds}}. Each peer gets one
+# pooled keep-alive client, and commands go out to every peer at once, each with
+# its own deadline, so a group answers in one round trip and a dead speaker only
+# costs its own timeout.
+
+PEER_TIMEOUT = 2.0 # Seconds a peer gets to answer unless its definition says otherwise
+KEEPALIVE_EXPIRY = 60.0 # Seconds an idle connection to a peer is kept open
+
+_clients = {} # url -> (event loop, httpx.AsyncClient)
+_clients_lock = Lock()
+_closing = set() # aclose() tasks still running
+
+_peer_seconds = metrics.Histogram(
+    "nexo_group_peer_seconds", "Round trip of a command to a group peer", ["peer", "result"],
+)
+
+def get_peers():
+    """The stored group definition, {name: {"url", "timeout"}}."""
+    return dict(db.get("group", {}))
+
+def set_peer(name, url, timeout=None):
+    """Adds or replaces a peer."""
+    peers = get_peers()
+    old = peers.get(name)
+    peers[name] = {"url": url.rstrip("/"), "timeout": timeout}
+    db.set("group", peers)
+    if old and old["url"] != peers[name]["url"]:
+        _drop_client(old["url"], peers)
+    return peers[name]
+
+def remove_peer(name):
+    """Removes a peer. Returns False if it was not in the group."""
+    peers = get_peers()
+    old = peers.pop(name, None)
+    if old is None:
+        return False
+    db.set("group", peers)
+    _drop_client(old["url"], peers)
+    return True
+
+# Clients
+
+def _client(url):
+    """The pooled client for a peer. Clients belong to the loop that made them, so another loop gets its own."""
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        entry = _clients.get(url)
+        if entry is not None and entry[0] is loop:
+            return entry[1]
+        client = httpx.AsyncClient(
+            base_url=url,
+            limits=httpx.Limits(max_connections=4, max_keepalive_connections=2, keepalive_expiry=KEEPALIVE_EXPIRY),
+        )
+        _clients[url] = (loop, client)
+    if entry is not None:
+        _close_client(*entry)
+    return client
+
+def _drop_client(url, peers):
+    """Closes the client for a URL no peer uses any more."""
+    if any(peer["url"] == url for peer in peers.values()):
+        return
+    with _clients_lock:
+        entry = _clients.pop(url, None)
+    if entry is not None:
+        _close_client(*entry)
+
+def _close_client(loop, client):
+    """Closes a client's pooled connections on the loop that owns them. A loop that stopped has dropped them already."""
+    if loop.is_closed() or not loop.is_running():
+        return
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None # Called from a plain thread
+    if loop is running:
+        task = loop.create_task(client.aclose())
+        _closing.add(task) # The loop only keeps a weak reference to its tasks
+        task.add_done_callback(_closing.discard)
+    else:
+        asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+
+async def _call_peer(name, peer, method, path, payload):
+    timeout = peer.get("timeout") or PEER_TIMEOUT
+    start = perf_counter()
+    try:
+        # wait_for bounds the whole exchange; httpx's own timeouts are per connect/read
+        response = await asyncio.wait_for(_client(peer["url"]).request(method, path, json=payload), timeout)
+        try:
+            body = response.json()
+        except ValueError:
+            body = response.text
+        result = {"ok": response.is_success, "status": response.status_code, "body": body}
+    except asyncio.TimeoutError:
+        result = {"ok": False, "error": f"timed out after {timeout} s"}
+    except Exception as e:
+        result = {"ok": False, "error": str(e) or type(e).__name__}
+
+    elapsed = perf_counter() - start
+    _peer_seconds.observe(elapsed, peer=name, result="ok" if result["ok"] else "error")
+    result["ms"] = round(elapsed * 1000, 1)
+    return name, result
+
+async def fan_out(method, path, payload=None, peers=None):
+    """
+    Sends the same request to every peer (or the given {name: peer} subset) concurrently.
+    Returns {name: {"ok", "status", "body", "ms"}}, or {"ok": False, "error", "ms"} for peers that failed.
+    """
+    peers = get_peers() if peers is None else peers
+    if not peers:
+        return {}
+    with tracing.span("group.fan_out", path=path, peers=len(peers)):
+        results = await asyncio.gather(*(
+            _call_peer(name, peer, method, path, payload) for name, peer in peers.items()
+        ))
+    for name, result in results:
+        if not result["ok"]:
+            print(f"Group Peer Error ({name}): {result.get('error', result.get('status'))}")
+    return dict(results)
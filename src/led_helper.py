@@ -2,6 +2,8 @@ from gpiozero import PWMLED, OutputDevice
 from threading import Timer
 from time import sleep
 
+import tracing
+
 # Config
 VOLUME_LED_PINS = [16, 12, 25, 24]
 MAIN_LED_PIN = 23
@@ -38,6 +40,7 @@ def _turn_off_vol_leds():
     for led in vol_leds:
         led.off()
 
+@tracing.traced("leds.update_volume_display")
 def update_volume_display(volume_percent):
     """Lights up the bar based on volume %."""
     global fade_timer
@@ -0,0 +1,130 @@
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+
+from carla_osc import EQ_BANDS
+
+# Loudness contour engine
+# Precomputes the Loudness EQ setting of every band for every volume step
+# (0-100) from the ISO 226:2003 equal-loudness contours. At runtime a volume
+# change is a single row lookup. Tables are cached on disk, keyed by the
+# model parameters and max_volume, and only rebuilt when those change.
+
+CACHE_DIR = Path(__file__).resolve().parent.parent / "assets" / "config"
+CACHE_PREFIX = "loudness_contour_"
+
+# Model parameters. Changing any of these invalidates the cached tables.
+MODEL = {
+    "reference_volume": 80, # Volume step the DSP is tuned flat at (matches the old hand-tuned slopes)
+    "reference_phon": 80.0, # Listening level at reference_volume with the default max_volume
+    "db_per_step": 0.5, # Level change per volume step
+    "reference_max_volume": 55, # max_volume the reference level was measured with
+    "db_per_max_volume_step": 0.5, # Level change per max_volume (amp) step
+    "min_phon": 20.0, # ISO 226 is only defined from 20 to 90 phon
+    "max_phon": 90.0,
+    "max_boost_db": 18.0, # Never boost a band by more than this
+    "min_freq": 40, # Bands below this stay flat; the bass presets pin 16 and 25 Hz at 0.5 too
+    "osc_per_db": 0.02, # LSP EQ units per dB, 0.5 being flat
+}
+
+# ISO 226:2003 table: frequency (Hz), exponent af, magnitude Lu (dB), hearing threshold Tf (dB)
+ISO_FREQS = np.array([
+    20, 25, 31.5, 40, 50, 63, 80, 100, 125, 160, 200, 250, 315, 400, 500,
+    630, 800, 1000, 1250, 1600, 2000, 2500, 3150, 4000, 5000, 6300, 8000, 10000, 12500,
+])
+ISO_AF = np.array([
+    0.532, 0.506, 0.480, 0.455, 0.432, 0.409, 0.387, 0.367, 0.349, 0.330, 0.315, 0.301, 0.288, 0.276, 0.267,
+    0.259, 0.253, 0.250, 0.246, 0.244, 0.243, 0.243, 0.243, 0.242, 0.242, 0.245, 0.254, 0.271, 0.301,
+])
+ISO_LU = np.array([
+    -31.6, -27.2, -23.0, -19.1, -15.9, -13.0, -10.3, -8.1, -6.2, -4.5, -3.1, -2.0, -1.1, -0.4, 0.0,
+    0.3, 0.5, 0.0, -2.7, -4.1, -1.0, 1.7, 2.5, 1.2, -2.1, -7.1, -11.2, -10.7, -3.1,
+])
+ISO_TF = np.array([
+    78.5, 68.7, 59.5, 51.1, 44.0, 37.5, 31.5, 26.5, 22.1, 17.9, 14.4, 11.4, 8.6, 6.2, 4.4,
+    3.0, 2.2, 2.4, 3.5, 1.7, -1.3, -4.2, -6.0, -5.4, -1.5, 6.0, 12.6, 13.9, 12.3,
+])
+
+BAND_FREQS = sorted(EQ_BANDS) # Column order of the table
+
+_table = None # (max_volume, key, rows) currently loaded, rows[volume] = {freq: value}
+
+def _equal_loudness_spl(phon):
+    """SPL (dB) each ISO frequency needs to sound as loud as `phon`. phon: array of levels."""
+    phon = np.asarray(phon, dtype=float)[:, None]
+    af = 4.47e-3 * (10 ** (0.025 * phon) - 1.15) + (0.4 * 10 ** ((ISO_TF + ISO_LU) / 10 - 9)) ** ISO_AF
+    return (10 / ISO_AF) * np.log10(af) - ISO_LU + 94
+
+def _table_key(max_volume, model):
+    blob = json.dumps({"model": model, "max_volume": max_volume, "bands": BAND_FREQS}, sort_keys=True)
+    return hashlib.sha1(blob.encode()).hexdigest()[:12]
+
+def build_table(max_volume, model=MODEL):
+    """
+    Returns a (101, len(BAND_FREQS)) array of Loudness EQ values, one row per volume step.
+    Each band gets the boost that keeps it as loud, relative to 1 kHz, as it is at the reference level.
+    """
+    volumes = np.arange(101)
+    amp_offset = model["db_per_max_volume_step"] * (max_volume - model["reference_max_volume"])
+    phon = model["reference_phon"] + model["db_per_step"] * (volumes - model["reference_volume"]) + amp_offset
+    phon = np.clip(phon, model["min_phon"], model["max_phon"])
+
+    # How much louder than the tone itself each frequency must be played, at each level
+    relative = _equal_loudness_spl(phon) - phon[:, None]
+    reference = _equal_loudness_spl([model["reference_phon"]])[0] - model["reference_phon"]
+    boost_iso = relative - reference
+
+    # Resample from the ISO frequencies to our EQ bands (log-frequency, edges held)
+    log_bands = np.log10(BAND_FREQS)
+    boost = np.array([np.interp(log_bands, np.log10(ISO_FREQS), row) for row in boost_iso])
+
+    # Only ever boost (the DSP is tuned flat at the reference), and not too far.
+    # Sub-bass is left alone: the woofer can't take it and the presets keep it flat
+    boost = np.clip(boost, 0.0, model["max_boost_db"])
+    boost[:, np.array(BAND_FREQS) < model["min_freq"]] = 0.0
+    return np.clip(0.5 + boost * model["osc_per_db"], 0.5, 1.0)
+
+def load_table(max_volume, model=MODEL):
+    """
+    Makes the table for max_volume current, from memory, the disk cache, or by building it.
+    Stale cache files (other keys) are removed when a new table is written.
+    """
+    global _table
+    key = _table_key(max_volume, model)
+    if _table is not None and _table[1] == key:
+        return
+
+    path = CACHE_DIR / f"{CACHE_PREFIX}{key}.npy"
+    table = None
+    if path.exists():
+        try:
+            table = np.load(path)
+        except Exception as e:
+            print(f"Loudness table cache unreadable ({e}), rebuilding.")
+
+    if table is None or table.shape != (101, len(BAND_FREQS)):
+        print(f"Building loudness contour table for max_volume {max_volume}...")
+        table = build_table(max_volume, model)
+        try:
+            for old in CACHE_DIR.glob(f"{CACHE_PREFIX}*.npy"):
+                old.unlink()
+            np.save(path, table)
+        except Exception as e:
+            print(f"Failed to cache loudness table: {e}")
+
+    # Pre-build the per-volume dictionaries, so a lookup allocates nothing
+    rows = [
+        {freq: round(float(value), 3) for freq, value in zip(BAND_FREQS, row)}
+        for row in table
+    ]
+    _table = (max_volume, key, rows)
+
+def get_contour(volume, max_volume):
+    """Returns {freq: Loudness EQ value} for a volume step (0-100)."""
+    table = _table
+    if table is None or table[0] != max_volume:
+        load_table(max_volume)
+        table = _table
+    return table[2][max(0, min(100, int(volume)))]
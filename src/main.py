@@ -1,3 +1,4 @@
+import os
 from gpiozero import Button
 from signal import pause
 from time import sleep
@@ -7,6 +8,7 @@ import uvicorn
 import main_controller as controller
 import led_helper as leds
 import startup
+import tracing
 from data_handler import db
 from api import app
 
@@ -20,6 +22,7 @@ HOLD_TIME = 0.6 # Faster hold response
 BOUNCE_TIME = 0.05
 MULTI_CLICK_SPEED = 0.4 
 RAMP_SPEED = 0.1
+API_PORT = int(os.environ.get("NEXO_API_PORT", 8000))
 
 # Buttons
 btn_down = Button(BTN_VOL_DOWN, pull_up=False, hold_time=HOLD_TIME, bounce_time=BOUNCE_TIME)
@@ -55,8 +58,10 @@ def on_vol_held(direction):
     while btn_obj.is_pressed:
         if controller.state['active_btn'] != button_name:
             return # Another button took over
-        controller.change_volume(5 * direction) # Change by +/- 5
-        leds.ramp_main_led() # Tiny blink for feedback
+        # Every step is its own trace, so each one can be followed to the amp
+        with tracing.trace("button.vol_hold_step", direction=direction):
+            controller.change_volume(5 * direction) # Change by +/- 5
+            leds.ramp_main_led() # Tiny blink for feedback
         sleep(RAMP_SPEED)
 
 def on_vol_press(direction):
@@ -75,21 +80,23 @@ def on_vol_press(direction):
         return # Another button took over
     
     print(f"Tap {button_name}")
-    controller.sync_volume()
-    controller.change_volume(5 * direction)
-    leds.ramp_main_led() # Tiny blink for feedback
+    with tracing.trace("button.vol_press", direction=direction):
+        controller.sync_volume()
+        controller.change_volume(5 * direction)
+        leds.ramp_main_led() # Tiny blink for feedback
 
 # Play button
 def execute_play_logic():
     count = controller.state['click_count']
     controller.state['click_count'] = 0 # Reset
     
-    if count == 1:
-        controller.media_action('play_pause')
-    elif count == 2:
-        controller.media_action('next')
-    elif count >= 3:
-        controller.media_action('prev')
+    with tracing.trace("button.play", clicks=count):
+        if count == 1:
+            controller.media_action('play_pause')
+        elif count == 2:
+            controller.media_action('next')
+        elif count >= 3:
+            controller.media_action('prev')
 
 def on_play_press():
     # Cancel previous timer
@@ -116,7 +123,7 @@ def on_play_hold():
 
 def start_api_server():
     # We run uvicorn programmatically.
-    uvicorn.run(app, host="0.0.0.0", port=8000, log_level="warning")
+    uvicorn.run(app, host="0.0.0.0", port=API_PORT, log_level="warning")
 
 # Volume Up
 btn_up.when_released = lambda: on_vol_press(1)
@@ -151,7 +158,7 @@ controller.start_workers()
 # We start this in a daemon thread so it runs in the background
 api_thread = Thread(target=start_api_server, daemon=True)
 api_thread.start()
-print("--- API SERVER STARTED (Port 8000) ---")
+print(f"--- API SERVER STARTED (Port {API_PORT}) ---")
 
 print("--- SYSTEM READY ---")
 
@@ -1,13 +1,19 @@
-from threading import Timer, Thread
-from time import sleep
-import subprocess
+from threading import Timer, Thread, Lock, Condition
+from queue import Queue, Empty
+from time import sleep, monotonic, perf_counter, time
+import json
 
 import spotify_helper as spotify
 import led_helper as leds
 import bluetooth_helper as bluetooth
 import system_helper as system
 import data_handler
-from carla_osc import set_loudness_contour_eq
+import loudness_contour
+import metrics
+import tracing
+from state_hub import StateHub
+from command_queue import CommandQueue
+from carla_osc import set_loudness_contour_eq, ramp_loudness_contour_eq
 
 # --- SHARED STATE ---
 # This dictionary lives here. Anyone importing this file shares this state
@@ -22,50 +28,210 @@ state = {
     'down_held': False,
     'up_held': False,
     'active_btn': None,
+    'player_signals': False, # True once spotifyd's MPRIS signals are subscribed
 }
 
-LOUDNESS_SLOPES = {
-    40: 0.00394,
-    63: 0.00521,
-    100: 0.00372,
-}
+LOUDNESS_SETTLE_DELAY = 2.0 # Seconds the amp gets to settle before the EQ follows a volume drop
+LOUDNESS_RAMP_TIME = 0.3 # Seconds the EQ then takes to glide to its new values
+
+POSITION_TOLERANCE = 0.5 # Seconds a new position anchor may differ from the extrapolated old one before it is pushed
+
+VOLUME_RECONCILE_INTERVAL = 5.0 # Seconds between fallback volume polls while MPRIS signals are flowing
+VOLUME_POLL_INTERVAL = 0.1 # Poll rate for the playerctl backend, which has no signals
+
+_volume_events = Queue()
+
+_position = {'position': 0.0, 'rate': 0.0, 'timestamp': monotonic()}
+_position_lock = Lock()
+_bouncer_lock = Lock()
+
+# Push state
+# The hub holds the document /ws/state and /sse/state stream to the app. Fields are
+# published where they change; the background loop republishes what has no signals.
+hub = StateHub()
+
+# Command queues for the API: controls run in order on one thread,
+# slow network jobs (nmcli) on another so they never delay a skip
+commands = CommandQueue("control")
+network_commands = CommandQueue("network")
+
+metrics.register_collector(
+    "nexo_command_queue_depth", "API commands waiting to run",
+    lambda: {queue.name: queue.depth() for queue in (commands, network_commands)}, label="queue",
+)
 
 CONNECT_SOUND_PATH = f"{data_handler.db.get('root_path')}/assets/sounds/connect.wav"
 
 # volume functions
+class _VolumeActor:
+    """
+    Owns every volume change: buttons, the API and the volume worker only post a target.
+    The mailbox holds one value, so a slider drag that posts faster than the hardware
+    keeps up is applied as its newest value only (last value wins).
+    The actor thread is the only one touching the amp, the loudness EQ and the saved volume.
+    """
+
+    def __init__(self):
+        self.cond = Condition()
+        self.pending = None # (volume, external, posted_at, trace context, waiters) waiting to be applied
+        self.busy = False # True while a value is being applied
+        self.applied = None # Volume the hardware currently has
+        self.thread = None
+        self.stats = {
+            "posted": 0, "applied": 0, "coalesced": 0,
+            "last_latency_ms": 0.0, "max_latency_ms": 0.0, "total_latency_ms": 0.0,
+        }
+
+    def start(self):
+        """Starts the actor thread, taking the current state volume as what the hardware has."""
+        with self.cond:
+            if self.thread is None:
+                self.applied = state['volume']
+                self.thread = Thread(target=self._run, name="volume-actor", daemon=True)
+                self.thread.start()
+
+    def post(self, volume, external=False, on_applied=None):
+        """
+        Queues volume (0-100) to be applied.
+        external=True means the player already has it (e.g. changed on the phone),
+        so only the EQ, LEDs and config follow.
+        on_applied(volume) is called from the actor thread with the volume that was actually
+        applied (a newer one if this was superseded), or None if applying it failed.
+        """
+        self.start()
+        context = tracing.current()
+        waiters = [on_applied] if on_applied else []
+        with self.cond:
+            self.stats["posted"] += 1
+            replaced = self.pending
+            if replaced is not None:
+                self.stats["coalesced"] += 1
+                waiters = replaced[4] + waiters # Whoever waited on the old value gets the one that replaced it
+            self.pending = (volume, external, monotonic(), context, waiters)
+            self.cond.notify()
+        if replaced is not None:
+            # The older press never reaches the hardware; its trace ends here
+            tracing.record("volume.superseded", replaced[3], tracing.now(), volume=replaced[0])
+
+    def idle(self):
+        """True when nothing is waiting or being applied."""
+        with self.cond:
+            return self.pending is None and not self.busy
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.pending is None:
+                    self.busy = False
+                    self.cond.wait()
+                volume, external, posted_at, context, waiters = self.pending
+                self.pending = None
+                self.busy = True
+            waited = (monotonic() - posted_at) * 1000000
+            tracing.record("volume.mailbox", context, tracing.now() - int(waited))
+            applied = volume
+            try:
+                with tracing.attach(context), tracing.span("volume.apply", volume=volume, external=external):
+                    with metrics.volume_apply_seconds.time():
+                        self._apply(volume, external)
+            except Exception as e:
+                print(f"Volume Actor Error: {e}")
+                applied = None
+            self._record_latency(monotonic() - posted_at)
+            for on_applied in waiters:
+                try:
+                    on_applied(applied)
+                except Exception as e:
+                    print(f"Volume Actor Callback Error: {e}")
+
+    def _apply(self, new_volume, external):
+        old_volume = self.applied
+        self.applied = new_volume
+
+        if external:
+            update_loudness_contour(new_volume)
+        elif new_volume > old_volume:
+            # Drop EQ first to prevent clipping
+            update_loudness_contour(new_volume)
+            _apply_hardware_volume(new_volume)
+        elif new_volume < old_volume:
+            # Drop Amp volume first to prevent bass spikes
+            _apply_hardware_volume(new_volume)
+            # Then raise the EQ once the hardware caught up. This is scheduled, not slept:
+            # a newer change simply retargets the pending ramp.
+            update_loudness_contour(new_volume, delay=LOUDNESS_SETTLE_DELAY, duration=LOUDNESS_RAMP_TIME)
+
+        # Visual Feedback and save to DB
+        leds.update_volume_display(new_volume)
+        hub.publish(volume=new_volume)
+        data_handler.db.set("volume", new_volume)
+
+    def _record_latency(self, seconds):
+        latency_ms = seconds * 1000
+        with self.cond:
+            self.stats["applied"] += 1
+            self.stats["last_latency_ms"] = latency_ms
+            self.stats["max_latency_ms"] = max(self.stats["max_latency_ms"], latency_ms)
+            self.stats["total_latency_ms"] += latency_ms
+
+    def get_stats(self):
+        with self.cond:
+            stats = dict(self.stats)
+            stats["queue_depth"] = (self.pending is not None) + self.busy
+        applied = stats.pop("applied")
+        total = stats.pop("total_latency_ms")
+        stats["applied"] = applied
+        stats["avg_latency_ms"] = round(total / applied, 3) if applied else 0.0
+        stats["last_latency_ms"] = round(stats["last_latency_ms"], 3)
+        stats["max_latency_ms"] = round(stats["max_latency_ms"], 3)
+        return stats
+
+_volume_actor = _VolumeActor()
+
+@tracing.traced("controller.sync_volume")
 def sync_volume():
     """Syncs internal state with Spotify's actual volume."""
+    if not _volume_actor.idle():
+        return # The player hasn't caught up with our own pending change yet
     state['volume'] = spotify.get_volume()
     print(f"Synced volume: {state['volume']}%")
 
-def change_volume(amount, override=False):
+@tracing.traced("controller.change_volume")
+def change_volume(amount, override=False, on_applied=None):
     """
     Main volume function. Called by Buttons OR API.
+    Returns right away; the volume actor applies the newest target in the background
+    and calls on_applied(volume) once it did (see _VolumeActor.post).
     """
-    old_volume = state['volume']
-    
+    start = perf_counter()
+    _volume_actor.start() # Before state['volume'] moves to the new target
+
     # Update State
     if override:
         new_volume = max(0, min(100, amount))
     else:
         new_volume = max(0, min(100, state['volume'] + amount))
-        
-    state['volume'] = new_volume
-    
-    if new_volume > old_volume:
-        # Drop EQ first to prevent clipping
-        update_loudness_contour(new_volume)
-        _apply_hardware_volume(new_volume)
-    elif new_volume < old_volume:
-        # Drop Amp volume first to prevent bass spikes
-        _apply_hardware_volume(new_volume)
-        sleep(2) # Short delay to let hardware catch up before adjusting EQ
-        update_loudness_contour(new_volume)
-
-    # Visual Feedback and save to DB
-    leds.update_volume_display(state['volume'])
-    data_handler.db.set("volume", state['volume'])
 
+    # state holds the target, so relative steps (a held button) build on each other
+    state['volume'] = new_volume
+    _volume_actor.post(new_volume, on_applied=on_applied)
+    metrics.change_volume_seconds.observe(perf_counter() - start)
+
+def get_volume_stats():
+    """Volume actor counters: queue depth, coalesced changes and apply latency."""
+    return _volume_actor.get_stats()
+
+metrics.register_collector(
+    "nexo_volume_changes_total", "Volume targets posted to the actor, applied, or replaced before they were applied",
+    lambda: {key: value for key, value in get_volume_stats().items() if key in ("posted", "applied", "coalesced")},
+    kind="counter", label="result",
+)
+metrics.register_collector(
+    "nexo_volume_queue_depth", "Volume changes waiting or being applied",
+    lambda: get_volume_stats()["queue_depth"],
+)
+
+@tracing.traced("controller.apply_hardware_volume")
 def _apply_hardware_volume(vol):
     """Helper function to apply volume changes to the correct output."""
     if state['current_mode'] == 'bluetooth':
@@ -80,6 +246,7 @@ def get_volume():
     return state['volume']
 
 # media control functions
+@tracing.traced("controller.media_action")
 def media_action(action):
     """
     Unified media control.
@@ -129,7 +296,7 @@ def update_mute_status(status=None):
     print(f"Updating Amp Mute Status...{status}")
     try:
         if status is None:
-            status = subprocess.check_output(["playerctl", "status"], text=True).strip()
+            status = metrics.check_output(["playerctl", "status"], text=True).strip()
         if status == "Playing":
             leds.set_amp_mute(False)
         else:
@@ -146,6 +313,8 @@ def background_worker_loop():
     hardware_sink = system.find_hardware_sink()
     
     while True:
+        iteration_start = perf_counter()
+
         # Check Spotify Status
         spotify_active, status = system.is_spotify_active()
         
@@ -191,119 +360,253 @@ def background_worker_loop():
             state['bt_owner_mac'] = None # Open for connections
             leds.ramp_main_led(1.0) # Feedback
 
+        # Push what changed. Spotify over MPRIS pushes its own changes, except after a mode switch
+        mode_changed = hub.get("mode") != state['current_mode']
+        hub.publish(mode=state['current_mode'])
+        if mode_changed or not state['player_signals'] or state['current_mode'] == 'bluetooth':
+            _publish_playback(status)
+
         # Bluetooth Security
         if state['current_mode'] == 'bluetooth':
             _bluetooth_bouncer()
 
         system.set_hardware_volume(state['max_volume'], forced_sink=hardware_sink)
 
+        metrics.worker_iteration_seconds.observe(perf_counter() - iteration_start, worker="background")
         sleep(2)
 
+def _on_bluetooth_connection(mac, connected):
+    """BlueZ listener: runs the bouncer the moment any device connects or drops."""
+    if state['current_mode'] == 'bluetooth':
+        _bluetooth_bouncer()
+
 def _bluetooth_bouncer():
     """Ensures only 1 person connects and trusts them."""
-    try:
-        connected = bluetooth.get_connected_devices()
+    # Called from both the BlueZ signal handler and the background loop
+    with _bouncer_lock:
+        try:
+            connected = bluetooth.get_connected_devices()
 
-        # New Connection -> Lock it
-        if state['bt_owner_mac'] is None and len(connected) > 0:
-            state['bt_owner_mac'] = connected[0]
-            print(f"BT Locked to: {state['bt_owner_mac']}")
+            # New Connection -> Lock it
+            if state['bt_owner_mac'] is None and len(connected) > 0:
+                state['bt_owner_mac'] = connected[0]
+                print(f"BT Locked to: {state['bt_owner_mac']}")
 
-            # Make invisible so nobody else tries to pair
-            subprocess.run(["bluetoothctl", "discoverable", "off"], check=False)
-            subprocess.run(["bluetoothctl", "pairable", "off"], check=False)
+                # Make invisible so nobody else tries to pair
+                bluetooth.set_adapter_properties(discoverable=False, pairable=False)
 
-        # Owner Left -> Unlock
-        elif state['bt_owner_mac'] and state['bt_owner_mac'] not in connected:
-            state['bt_owner_mac'] = None
-            print("BT Unlocked.")
-            
-            # Re-open the doors for anyone
-            subprocess.run(["bluetoothctl", "discoverable", "on"], check=False)
-            subprocess.run(["bluetoothctl", "pairable", "on"], check=False)
-
-        # Intruder -> Kick
-        if len(connected) > 1:
-            print(f"Too many devices! Enforcing limit...")
-            for mac in connected:
-                if mac != state['bt_owner_mac']:
-                    bluetooth.disconnect_device(mac)
-                    
-    except Exception as e:
-        print(f"Enforcer Error: {e}")
+            # Owner Left -> Unlock
+            elif state['bt_owner_mac'] and state['bt_owner_mac'] not in connected:
+                state['bt_owner_mac'] = None
+                print("BT Unlocked.")
+
+                # Re-open the doors for anyone
+                bluetooth.set_adapter_properties(discoverable=True, pairable=True)
+
+            # Intruder -> Kick
+            if len(connected) > 1:
+                print(f"Too many devices! Enforcing limit...")
+                for mac in connected:
+                    if mac != state['bt_owner_mac']:
+                        bluetooth.disconnect_device(mac)
+
+        except Exception as e:
+            print(f"Enforcer Error: {e}")
+
+def _on_player_properties(changed):
+    """MPRIS listener: forwards volume changes to the volume worker and re-anchors the position model."""
+    if "Volume" in changed:
+        _volume_events.put(int(round(changed["Volume"] * 100)))
+    if "PlaybackStatus" in changed or "Metadata" in changed:
+        _anchor_position(spotify.get_position(), changed.get("PlaybackStatus"))
+        if state['current_mode'] == 'spotify':
+            _publish_playback()
+
+def _on_player_seeked(position_sec):
+    """MPRIS listener: the user scrubbed, so the position jumps but the rate stays."""
+    _anchor_position(position_sec)
+
+# Playback position model
+# Stores where the track was at a monotonic timestamp and how fast it moves,
+# so the current position is plain arithmetic instead of a player query.
+
+def _anchor_position(position_sec, status=None):
+    """Re-anchors the position model at position_sec (seconds), now."""
+    if position_sec is None:
+        return
+    if status is None:
+        status = spotify.get_properties().get("PlaybackStatus")
+    rate = spotify.get_properties().get("Rate", 1.0) if status == "Playing" else 0.0
+
+    with _position_lock:
+        _position.update(position=position_sec, rate=rate, timestamp=monotonic())
+    if state['current_mode'] == 'spotify':
+        _publish_position(position_sec, rate, time())
+
+def get_track_position():
+    """Extrapolates the current track position in seconds from the last anchor."""
+    with _position_lock:
+        position = _position['position'] + _position['rate'] * (monotonic() - _position['timestamp'])
+
+    # Don't run past the end of the track if the next Metadata signal is late
+    length = spotify.get_properties().get("Metadata", {}).get("mpris:length")
+    if length:
+        position = min(position, length / 1000000)
+    return max(0.0, position)
+
+# Push helpers
+
+def _publish_position(position_sec, rate, at):
+    """Pushes a position anchor (position_sec at wall-clock `at`, moving at `rate`) unless the old one still predicts it."""
+    old = hub.get("position")
+    if old and old["rate"] == rate:
+        predicted = old["position_sec"] + rate * (at - old["at"])
+        if abs(predicted - position_sec) < POSITION_TOLERANCE:
+            return
+    hub.publish(position={"position_sec": round(position_sec, 3), "rate": rate, "at": round(at, 3)})
+
+_bluetooth_report = {} # Position and status BlueZ last reported; its Position only moves when the phone says so
+
+def _publish_playback(status=None):
+    """Pushes track, status and position of the current source."""
+    if state['current_mode'] == 'spotify':
+        _bluetooth_report.clear() # So switching back to Bluetooth re-anchors
+    if state['current_mode'] == 'spotify' and state['player_signals']:
+        # Cached properties; the position anchor is pushed by _anchor_position
+        track = spotify.get_track_info(live_position=False)
+        status = spotify.get_properties().get("PlaybackStatus")
+    elif state['current_mode'] == 'spotify':
+        track = spotify.get_track_info()
+        _publish_position(track["position_sec"], 1.0 if status == "Playing" else 0.0, time())
+    else:
+        track = system.get_track_info_bluetooth()
+        report = {"position_sec": track["position_sec"], "status": track.pop("status")}
+        # Re-anchor only on a new report, a cached Position re-anchored every tick would freeze the track
+        if report != _bluetooth_report:
+            _bluetooth_report.update(report)
+            _publish_position(report["position_sec"], 1.0 if report["status"] == "playing" else 0.0, time())
+        status = None
+
+    track.pop("position_sec", None)
+    hub.publish(track=track, status=status)
+
+def _publish_eq():
+    db = data_handler.db
+    hub.publish(eq={
+        "bass": db.get("current_eq_bass"),
+        "treble": db.get("current_eq_treble"),
+        "enabled": db.get("eq_enabled", True),
+    })
+
+def _on_config_change(version, changed):
+    """Config listener: pushes the settings version (so clients know to refetch /settings) and the EQ state."""
+    hub.publish(settings_version=version)
+    if {"current_eq_bass", "current_eq_treble", "eq_enabled"} & set(changed):
+        _publish_eq()
 
 def volume_worker_loop():
-    """Polls playerctl at 10Hz to catch external volume changes instantly."""
-    
+    """
+    Applies external volume changes (e.g. from the phone) as soon as spotifyd signals them.
+    Falls back to polling when signals are unavailable, and reconciles slowly otherwise.
+    """
+    poll_interval = VOLUME_RECONCILE_INTERVAL if state['player_signals'] else VOLUME_POLL_INTERVAL
+
     last_known_volume = get_volume()
-    
+
     while True:
         try:
-            result = subprocess.run(
-                ["playerctl", "volume"], 
-                capture_output=True, 
-                text=True, 
-                timeout=0.2
-            )
-            if result.returncode == 0 and result.stdout.strip():
-                external_vol_float = float(result.stdout.strip())
-                current_vol = int(external_vol_float * 100)
-                
-                if current_vol != last_known_volume:
-                    state['volume'] = current_vol
-                    update_loudness_contour(current_vol)
-                    
-                    leds.update_volume_display(current_vol)
-                    data_handler.db.set("volume", current_vol)
-                    
-                    last_known_volume = current_vol
-                    
-        except subprocess.TimeoutExpired:
-            pass # DBus was busy, just try again next loop
-        except ValueError:
-            pass # playerctl returned something weird (not a number)
-        except Exception as e:
-            # playerctl might return an error if no players are active. Just ignore.
-            pass
-            
-        sleep(0.1)
+            current_vol = _volume_events.get(timeout=poll_interval)
+        except Empty:
+            current_vol = spotify.get_volume(fallback=None)
+            if current_vol is None:
+                continue # No player right now, just try again next round
+
+        if current_vol == last_known_volume:
+            continue
+        if not _volume_actor.idle():
+            continue # A local change is in flight; its steps echo back, a real change is picked up next poll
+        last_known_volume = current_vol
+
+        if current_vol == state['volume']:
+            continue # Echo of our own change_volume
+
+        state['volume'] = current_vol
+        _volume_actor.post(current_vol, external=True)
 
 def start_workers():
+    # Build (or load) the loudness table now, not on the first button press
+    loudness_contour.load_table(state['max_volume'])
+
+    # Subscribe to spotifyd before the workers start, so no change slips through
+    state['player_signals'] = spotify.add_listener(_on_player_properties)
+    if state['player_signals']:
+        spotify.add_seek_listener(_on_player_seeked)
+        _anchor_position(spotify.get_position())
+
+    # Intruders are kicked as soon as BlueZ reports them, the 2 s loop is only a fallback
+    bluetooth.add_connection_listener(_on_bluetooth_connection)
+
+    _volume_actor.start()
+
+    # Initial push document; from here on changes are published where they happen
+    data_handler.db.add_listener(_on_config_change)
+    hub.publish(settings_version=data_handler.db.version)
+    _publish_eq()
+    hub.publish(volume=state['volume'], mode=state['current_mode'])
+    _publish_playback()
+
     t = Thread(target=background_worker_loop, daemon=True)
     t.start()
     
     v = Thread(target=volume_worker_loop, daemon=True)
     v.start()
 
-def get_full_system_state():
-    """
-    Compiles the complete state of the speaker for the App.
-    """
-    sync_volume()  # Ensure volume is up to date
-    # Get Playback Data
-    if state['current_mode'] == 'spotify':
-        track_data = spotify.get_track_info()
-    else:
-        track_data = system.get_track_info_bluetooth()
-
-    # Combine with System State
-    full_state = {
-        "volume": get_volume(),
-        "mode": state['current_mode'],
-        "track": track_data,
+def _state_document(fields, position_sec):
+    """Shapes the pushed fields like /status/state always looked, plus status and the position anchor."""
+    track = dict(fields.get("track") or {})
+    track["position_sec"] = position_sec
+    return {
+        "volume": fields.get("volume", state['volume']),
+        "mode": fields.get("mode", state['current_mode']),
+        "track": track,
+        "status": fields.get("status"),
+        "position": fields.get("position"),
     }
 
-    return full_state
+def _live_position(fields):
+    """Extrapolates the pushed position anchor to now, in seconds."""
+    anchor = fields.get("position") or {}
+    now = time()
+    return round(anchor.get("position_sec", 0) + anchor.get("rate", 0) * (now - anchor.get("at", now)), 3)
+
+def get_state_document():
+    """
+    Returns (version, JSON) of the state for /status/state.
+    track.position_sec is the live position, as it always was; "position" is the anchor
+    it was extrapolated from, for clients that extrapolate between polls themselves.
+    """
+    # Everything is kept current by the workers and listeners, so this is only a copy
+    version, fields = hub.fields()
+    return version, json.dumps(_state_document(fields, _live_position(fields)))
 
 def get_partial_system_state():
     """
     Returns a minimal state for quick checks.
     """
-    sync_volume()  # Ensure volume is up to date
+    if not state['player_signals']:
+        # playerctl backend: nothing is pushed to us, so ask the player
+        sync_volume()
+        return {
+            "volume": state['volume'],
+            "status": system.is_spotify_active()[1],
+            "position": spotify.get_track_position(),
+        }
+
+    # Everything here is cached or extrapolated, no player round-trip
     partial_state = {
-        "volume": get_volume(),
-        "status": system.is_spotify_active()[1],
-        "position": spotify.get_track_position(),
+        "volume": state['volume'],
+        "status": spotify.get_properties().get("PlaybackStatus"),
+        "position": round(get_track_position()),
     }
     return partial_state
 
@@ -322,17 +625,18 @@ def pairing_mode():
     """Enters speaker pairing mode."""
     system.create_temp_hotspot()
     
-def update_loudness_contour(current_volume):
-    """Updates the Loudness Contour EQ settings."""
-    vol_drop = 80 - current_volume # Calculate how much the volume is reduced from max
-    
-    eq_settings = {}
-    
-    for freq, slope in LOUDNESS_SLOPES.items():
-        osc_val = 0.5 + (slope * vol_drop) # Start at 0.5 (flat) and adjust based on volume drop
-        osc_val = max(0.5, min(1.0, osc_val)) # Clamp between 0.5 and 1
-        eq_settings[int(freq)] = round(osc_val, 3) # Round for cleaner OSC messages
-        
-    set_loudness_contour_eq(eq_settings)
+@tracing.traced("controller.update_loudness_contour")
+def update_loudness_contour(current_volume, delay=0.0, duration=0.0):
+    """
+    Updates the Loudness Contour EQ settings.
+    With a delay or duration the change is ramped by carla_osc's scheduler, otherwise it is immediate.
+    """
+    # One row of the precomputed table, every band at once
+    eq_settings = loudness_contour.get_contour(current_volume, state['max_volume'])
+
+    if delay or duration:
+        ramp_loudness_contour_eq(eq_settings, duration, delay)
+    else:
+        set_loudness_contour_eq(eq_settings)
     
     print(f"Loudness Contour Updated: {eq_settings}")
\ No newline at end of file
@@ -0,0 +1,219 @@
+import os
+import subprocess
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock
+from time import perf_counter
+
+import tracing
+
+# In-process metrics, served at /metrics in the Prometheus text format.
+# Counters and histograms are plain dicts behind one lock each, so recording
+# a sample costs about a microsecond and they can stay on in production.
+# Stats that other modules already keep (OSC, Bluetooth writer, storage...)
+# are read through collectors at scrape time instead of being counted twice.
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0) # Seconds
+
+_metrics = [] # Counters and histograms, in registration order
+_collectors = [] # (name, kind, help, label, fn) read at scrape time
+_registry_lock = Lock()
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {} # label values -> count
+        self._lock = Lock()
+        _register(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render(self, lines):
+        lines.append(f"# HELP {self.name} {self.help}")
+        lines.append(f"# TYPE {self.name} counter")
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_labels(zip(self.labels, key))} {_number(value)}")
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {} # label values -> [per-bucket counts..., sum, count]
+        self._lock = Lock()
+        _register(self)
+
+    def observe(self, seconds, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            value = self._values.get(key)
+            if value is None:
+                value = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                value[index] += 1
+            value[-2] += seconds
+            value[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes how long the with-block took, exceptions included."""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start, **labels)
+
+    def _render(self, lines):
+        lines.append(f"# HELP {self.name} {self.help}")
+        lines.append(f"# TYPE {self.name} histogram")
+        with self._lock:
+            values = [(key, list(value)) for key, value in self._values.items()]
+        for key, value in values:
+            pairs = list(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, value):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(pairs + [('le', _number(bound))])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(pairs + [('le', '+Inf')])} {value[-1]}")
+            lines.append(f"{self.name}_sum{_labels(pairs)} {_number(value[-2])}")
+            lines.append(f"{self.name}_count{_labels(pairs)} {value[-1]}")
+
+def _register(metric):
+    with _registry_lock:
+        _metrics.append(metric)
+
+def register_collector(name, help, fn, kind="gauge", label=None):
+    """
+    Exports a value read at scrape time. fn() returns a number, or {label value: number}
+    when label is given (e.g. the "sent"/"suppressed" counts of get_osc_stats()).
+    """
+    with _registry_lock:
+        _collectors.append((name, kind, help, label, fn))
+
+def _labels(pairs):
+    pairs = list(pairs)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return repr(value) if isinstance(value, float) else str(value)
+
+def render():
+    """The whole registry in the Prometheus text exposition format."""
+    lines = []
+    with _registry_lock:
+        metrics = list(_metrics)
+        collectors = list(_collectors)
+
+    for metric in metrics:
+        metric._render(lines)
+
+    for name, kind, help, label, fn in collectors:
+        try:
+            value = fn()
+        except Exception as e:
+            print(f"Metrics Collector Error ({name}): {e}")
+            continue
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        if isinstance(value, dict):
+            for key, item in value.items():
+                if isinstance(item, (int, float)) and not isinstance(item, bool):
+                    lines.append(f"{name}{_labels([(label, key)])} {_number(item)}")
+        elif value is not None:
+            lines.append(f"{name} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+# Shared metrics
+# Defined here so every module records into the same series.
+
+subprocess_seconds = Histogram(
+    "nexo_subprocess_seconds", "Time spent waiting for external commands", ["command"],
+)
+subprocess_failures = Counter(
+    "nexo_subprocess_failures_total", "External commands that failed to start or exited non-zero", ["command"],
+)
+dbus_call_seconds = Histogram(
+    "nexo_dbus_call_seconds", "Blocking D-Bus calls made through dbus_loop.run", ["call"],
+)
+osc_datagrams = Counter(
+    "nexo_osc_datagrams_total", "UDP datagrams sent to Carla, single messages or bundles", ["kind"],
+)
+osc_send_failures = Counter(
+    "nexo_osc_send_failures_total", "OSC sends that raised",
+)
+volume_apply_seconds = Histogram(
+    "nexo_volume_apply_seconds", "Time for the volume actor to apply one volume (EQ, amp, Bluetooth, config)",
+)
+change_volume_seconds = Histogram(
+    "nexo_change_volume_seconds", "Time spent in change_volume before it returns",
+)
+worker_iteration_seconds = Histogram(
+    "nexo_worker_iteration_seconds", "Time for one pass of a worker loop, sleeps excluded", ["worker"],
+)
+http_request_seconds = Histogram(
+    "nexo_http_request_seconds", "API handler latency", ["method", "route", "status"],
+)
+
+# Subprocess wrappers
+# Drop-in replacements for the subprocess calls, labelled by the program name.
+# Inside a trace each call also shows up as an "exec" span.
+
+def _command_name(args):
+    program = args[0] if isinstance(args, (list, tuple)) else str(args).split()[0]
+    return os.path.basename(str(program))
+
+def run(args, **kwargs):
+    """subprocess.run, timed per command."""
+    command = _command_name(args)
+    start = perf_counter()
+    try:
+        with tracing.span("exec", command=command):
+            result = subprocess.run(args, **kwargs)
+    except Exception:
+        subprocess_failures.inc(command=command)
+        raise
+    finally:
+        subprocess_seconds.observe(perf_counter() - start, command=command)
+    if result.returncode:
+        subprocess_failures.inc(command=command)
+    return result
+
+def check_output(args, **kwargs):
+    """subprocess.check_output, timed per command."""
+    command = _command_name(args)
+    start = perf_counter()
+    try:
+        with tracing.span("exec", command=command):
+            return subprocess.check_output(args, **kwargs)
+    except Exception:
+        subprocess_failures.inc(command=command)
+        raise
+    finally:
+        subprocess_seconds.observe(perf_counter() - start, command=command)
+
+def popen(args, **kwargs):
+    """subprocess.Popen for fire-and-forget commands; only the spawn is timed."""
+    command = _command_name(args)
+    start = perf_counter()
+    try:
+        with tracing.span("exec", command=command):
+            return subprocess.Popen(args, **kwargs)
+    except Exception:
+        subprocess_failures.inc(command=command)
+        raise
+    finally:
+        subprocess_seconds.observe(perf_counter() - start, command=command)
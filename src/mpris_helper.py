@@ -0,0 +1,321 @@
+import asyncio
+from dbus_next.aio import MessageBus
+from dbus_next.constants import BusType
+from dbus_next import Message, MessageType
+
+import dbus_loop
+
+# MPRIS client for spotifyd.
+# Keeps one session-bus connection and a cached proxy to the spotifyd player,
+# so reading the volume or skipping a track is a single D-Bus call instead of
+# a playerctl fork.
+
+PLAYER_PREFIX = "org.mpris.MediaPlayer2.spotifyd" # spotifyd registers as spotifyd.instance<pid>
+MPRIS_PATH = "/org/mpris/MediaPlayer2"
+PLAYER_IFACE = "org.mpris.MediaPlayer2.Player"
+
+DBUS_NAME = "org.freedesktop.DBus"
+DBUS_PATH = "/org/freedesktop/DBus"
+PROPS_IFACE = "org.freedesktop.DBus.Properties"
+
+# Match rules for the signals we care about. Filtering by sender happens in
+# _on_message, because spotifyd gets a new unique name every time it restarts.
+MATCH_RULES = [
+    f"type='signal',interface='{PROPS_IFACE}',member='PropertiesChanged',path='{MPRIS_PATH}'",
+    f"type='signal',interface='{PLAYER_IFACE}',member='Seeked',path='{MPRIS_PATH}'",
+    f"type='signal',sender='{DBUS_NAME}',interface='{DBUS_NAME}',member='NameOwnerChanged',arg0namespace='{PLAYER_PREFIX}'",
+]
+
+_bus = None
+_bus_lock = asyncio.Lock() # Concurrent first callers share one connect instead of each opening a bus
+_player = None # (bus_name, Player interface proxy)
+_owner = None # Unique bus name (":1.42") of the current spotifyd instance
+_listeners = []
+_seek_listeners = []
+_properties = None # Cached Properties.GetAll result for the current track (plain values)
+
+async def _bus_call(bus, member, *args, signature=""):
+    """Calls a method on the bus daemon itself and returns the reply body."""
+    reply = await bus.call(Message(
+        destination=DBUS_NAME,
+        path=DBUS_PATH,
+        interface=DBUS_NAME,
+        member=member,
+        signature=signature,
+        body=list(args),
+    ))
+    if reply.message_type == MessageType.ERROR:
+        raise RuntimeError(f"{member} failed: {reply.body}")
+    return reply.body
+
+async def _get_bus():
+    """Returns the shared Session Bus connection, reconnecting if it dropped."""
+    global _bus, _owner
+    async with _bus_lock:
+        if _bus is None or not _bus.connected:
+            bus = await MessageBus(bus_type=BusType.SESSION).connect()
+            try:
+                bus.add_message_handler(_on_message)
+                for rule in MATCH_RULES:
+                    await _bus_call(bus, "AddMatch", rule, signature="s")
+
+                name = await _find_player_name(bus)
+                _owner = (await _bus_call(bus, "GetNameOwner", name, signature="s"))[0] if name else None
+            except Exception:
+                bus.disconnect() # Half set up; don't leave it delivering signals
+                raise
+            _bus = bus
+    return _bus
+
+def _on_message(msg):
+    """Routes spotifyd signals to the registered listeners (runs on the D-Bus loop)."""
+    global _owner
+    if msg.message_type != MessageType.SIGNAL:
+        return
+
+    if msg.member == "NameOwnerChanged":
+        name, _, new_owner = msg.body
+        if name.startswith(PLAYER_PREFIX):
+            # spotifyd started, stopped or restarted: the cached proxy is stale either way
+            _owner = new_owner or None
+            _reset_player()
+        return
+
+    if msg.member == "PropertiesChanged" and msg.sender == _owner and msg.body[0] == PLAYER_IFACE:
+        changed = _unwrap(msg.body[1])
+        _update_properties(changed)
+        for callback in _listeners:
+            dbus_loop.dispatch(callback, changed)
+
+    elif msg.member == "Seeked" and msg.sender == _owner:
+        position_sec = msg.body[0] / 1000000
+        for callback in _seek_listeners:
+            dbus_loop.dispatch(callback, position_sec)
+
+async def _find_player_name(bus):
+    """Finds the bus name spotifyd registered, or None if it isn't on the bus."""
+    for name in (await _bus_call(bus, "ListNames"))[0]:
+        if name.startswith(PLAYER_PREFIX):
+            return name
+    return None
+
+async def _get_player():
+    """Returns the cached Player interface, resolving spotifyd on first use."""
+    global _player
+    if _player is not None:
+        return _player[1]
+
+    bus = await _get_bus()
+    name = await _find_player_name(bus)
+    if name is None:
+        raise RuntimeError("spotifyd is not on the session bus")
+
+    introspection = await bus.introspect(name, MPRIS_PATH)
+    proxy = bus.get_proxy_object(name, MPRIS_PATH, introspection)
+    _player = (name, proxy.get_interface(PLAYER_IFACE))
+    return _player[1]
+
+def _reset_player():
+    """Drops the cached proxy so the next call resolves spotifyd again (e.g. after a restart)."""
+    global _player, _properties
+    _player = None
+    _properties = None
+
+def _unwrap(variants):
+    """Turns a{sv} into plain values, including the nested Metadata dict."""
+    values = {key: variant.value for key, variant in variants.items()}
+    if "Metadata" in values:
+        values["Metadata"] = {key: variant.value for key, variant in values["Metadata"].items()}
+    return values
+
+def _track_id(properties):
+    return properties.get("Metadata", {}).get("mpris:trackid")
+
+def _update_properties(changed):
+    """
+    Folds a PropertiesChanged payload into the cache, which is keyed by track id.
+    Metadata for a different track drops the cache, so the next read does a
+    fresh GetAll (which also refreshes Position).
+    """
+    global _properties
+    if _properties is None:
+        return
+    if "Metadata" in changed and _track_id(changed) != _track_id(_properties):
+        _properties = None
+        return
+    # Copy-on-write so readers on other threads always see a consistent dict
+    _properties = {**_properties, **changed}
+
+async def _fetch_properties():
+    """Returns all player properties, using the cache when it is still valid."""
+    global _properties
+    if _properties is not None:
+        return _properties
+
+    bus = await _get_bus()
+    await _get_player()
+    reply = await bus.call(Message(
+        destination=_player[0],
+        path=MPRIS_PATH,
+        interface=PROPS_IFACE,
+        member="GetAll",
+        signature="s",
+        body=[PLAYER_IFACE],
+    ))
+    if reply.message_type == MessageType.ERROR:
+        _reset_player()
+        raise RuntimeError(f"GetAll failed: {reply.body}")
+
+    _properties = _unwrap(reply.body[0])
+    return _properties
+
+def _call(coro_fn, *args):
+    """Runs a player coroutine on the D-Bus loop, dropping the cached proxy on failure."""
+    async def runner():
+        try:
+            return await coro_fn(await _get_player(), *args)
+        except Exception:
+            _reset_player()
+            raise
+    runner.__name__ = coro_fn.__name__ # Labels the D-Bus call metrics
+    return dbus_loop.run(runner())
+
+# Player coroutines
+
+async def _read_volume(player):
+    return await player.get_volume()
+
+async def _write_volume(player, value):
+    await player.set_volume(value)
+
+async def _play_pause(player):
+    await player.call_play_pause()
+
+async def _next(player):
+    await player.call_next()
+
+async def _previous(player):
+    await player.call_previous()
+
+async def _read_position(player):
+    return await player.get_position()
+
+# Synchronous API (same signatures as spotify_helper)
+
+def add_listener(callback):
+    """
+    Registers callback(changed) for spotifyd's PropertiesChanged signals.
+    changed maps property names ("Volume", "PlaybackStatus", "Metadata"...) to plain values.
+    Callbacks run on the D-Bus dispatcher thread, so they may block.
+    Returns False if the session bus couldn't be reached, so signals aren't flowing yet.
+    """
+    _listeners.append(callback)
+    return _subscribe()
+
+def add_seek_listener(callback):
+    """
+    Registers callback(position_sec) for spotifyd's Seeked signal (runs on the dispatcher thread).
+    Returns False if the session bus couldn't be reached.
+    """
+    _seek_listeners.append(callback)
+    return _subscribe()
+
+def _subscribe():
+    try:
+        dbus_loop.run(_get_bus())
+        return True
+    except Exception as e:
+        print(f"MPRIS Subscribe Error: {e}") # The next call will retry the connection
+        return False
+
+def get_properties():
+    """
+    Returns the player's properties (Metadata, PlaybackStatus, Volume, Position...) as plain values.
+    Served from cache; only the first read after a track change costs a D-Bus round-trip.
+    Returns an empty dict if spotifyd isn't available.
+    """
+    cached = _properties
+    if cached is not None:
+        return cached
+    try:
+        return dbus_loop.run(_fetch_properties())
+    except Exception:
+        return {}
+
+def get_volume(fallback=50):
+    """Asks spotifyd for current volume (returns int 0-100)."""
+    try:
+        return int(round(_call(_read_volume) * 100))
+    except Exception:
+        return fallback
+
+def set_volume(vol_percent):
+    """Sets volume (0-100)."""
+    try:
+        _call(_write_volume, max(0, min(100, vol_percent)) / 100.0)
+    except Exception as e:
+        print(f"Error setting volume: {e}")
+
+def play_pause():
+    try:
+        _call(_play_pause)
+    except Exception as e:
+        print(f"MPRIS Error: {e}")
+
+def next_track():
+    try:
+        _call(_next)
+    except Exception as e:
+        print(f"MPRIS Error: {e}")
+
+def previous_track():
+    try:
+        _call(_previous)
+    except Exception as e:
+        print(f"MPRIS Error: {e}")
+
+def get_track_info(live_position=True):
+    """
+    Returns a dictionary with current track details.
+    live_position=False skips the Position read (callers that track position themselves).
+    """
+    info = {
+        "title": "Unknown Title",
+        "artist": "Unknown Artist",
+        "album": "Unknown Album",
+        "image_url": "",
+        "duration_sec": 0,
+        "position_sec": 0,
+    }
+
+    metadata = get_properties().get("Metadata")
+    if not metadata:
+        return info
+
+    info["title"] = metadata.get("xesam:title", info["title"])
+    info["artist"] = ", ".join(metadata.get("xesam:artist", [info["artist"]]))
+    info["album"] = metadata.get("xesam:album", info["album"])
+    info["image_url"] = metadata.get("mpris:artUrl", "")
+
+    # MPRIS times are in microseconds
+    info["duration_sec"] = metadata.get("mpris:length", 0) / 1000000
+    if not live_position:
+        return info
+    try:
+        # Position isn't signalled, so it is the one live read
+        info["position_sec"] = _call(_read_position) / 1000000
+    except Exception as e:
+        print(f"Metadata Error: {e}")
+
+    return info
+
+def get_position():
+    """Returns the exact track position in seconds, or None if spotifyd can't be reached."""
+    try:
+        return _call(_read_position) / 1000000
+    except Exception:
+        return None
+
+def get_track_position():
+    """Returns current track position in seconds."""
+    return round(get_position() or 0)
@@ -1,41 +1,107 @@
-import subprocess
+import metrics
+import tracing
 
-def get_volume():
-    """Asks spotifyd for current volume (returns int 0-100)."""
+import mpris_helper as mpris
+from data_handler import db
+
+# Backend is picked per call from the "spotify_backend" config key:
+# "mpris" talks to spotifyd over D-Bus, "playerctl" forks playerctl.
+PLAYERCTL = ["playerctl", "--player=spotifyd"]
+TRACK_FORMAT = "\t".join([
+    "{{xesam:title}}", "{{xesam:artist}}", "{{xesam:album}}",
+    "{{mpris:artUrl}}", "{{mpris:length}}", "{{position}}",
+])
+
+def _use_mpris():
+    return db.get("spotify_backend", "mpris") == "mpris"
+
+def get_volume(fallback=50):
+    """Asks spotifyd for current volume (returns int 0-100, or fallback if it can't be read)."""
+    if _use_mpris():
+        return mpris.get_volume(fallback)
     try:
         # playerctl returns float 0.0 to 1.0, we convert to int 0-100
-        output = subprocess.check_output(["playerctl", "volume"], text=True).strip()
+        output = metrics.check_output(PLAYERCTL + ["volume"], text=True).strip()
         if output:
             return int(round(float(output) * 100))
     except Exception:
         pass
-    return 50 # fallback volume
+    return fallback
 
+@tracing.traced("spotify.set_volume")
 def set_volume(vol_percent):
     """Sets volume (0-100)."""
     print(f"Setting Spotify volume to: {vol_percent}%")
+    if _use_mpris():
+        mpris.set_volume(vol_percent)
+        return
     try:
         # Convert 0-100 back to 0.0-1.0
         val = max(0, min(100, vol_percent)) / 100.0
-        subprocess.run(["playerctl", "volume", str(val)], check=False)
+        metrics.run(PLAYERCTL + ["volume", str(val)], check=False)
     except Exception as e:
         print(f"Error setting volume: {e}")
 
+def add_listener(callback):
+    """
+    Subscribes callback(changed) to spotifyd property changes.
+    Returns False when the playerctl backend is active or the session bus is unreachable
+    (no signals, callers must poll).
+    """
+    if not _use_mpris():
+        return False
+    return mpris.add_listener(callback)
+
+def add_seek_listener(callback):
+    """Subscribes callback(position_sec) to spotifyd seeks. Returns False on the playerctl backend."""
+    if not _use_mpris():
+        return False
+    return mpris.add_seek_listener(callback)
+
+def get_properties():
+    """Cached MPRIS player properties (Metadata, PlaybackStatus, Rate...). Empty on the playerctl backend."""
+    if not _use_mpris():
+        return {}
+    return mpris.get_properties()
+
+def get_position():
+    """Returns the exact track position in seconds (float), or None if it can't be read."""
+    if _use_mpris():
+        return mpris.get_position()
+    try:
+        pos_str = metrics.check_output(PLAYERCTL + ["position"], text=True).strip()
+        return float(pos_str) if pos_str else None
+    except Exception:
+        return None
+
 def play_pause():
-    subprocess.run(["playerctl", "play-pause"], check=False)
+    if _use_mpris():
+        mpris.play_pause()
+        return
+    metrics.run(PLAYERCTL + ["play-pause"], check=False)
 
 def next_track():
     print(">> Skipping Track")
-    subprocess.run(["playerctl", "next"], check=False)
+    if _use_mpris():
+        mpris.next_track()
+        return
+    metrics.run(PLAYERCTL + ["next"], check=False)
 
 def previous_track():
     print("<< Previous Track")
-    subprocess.run(["playerctl", "previous"], check=False)
-    
-def get_track_info():
+    if _use_mpris():
+        mpris.previous_track()
+        return
+    metrics.run(PLAYERCTL + ["previous"], check=False)
+
+def get_track_info(live_position=True):
     """
     Returns a dictionary with current track details.
+    live_position=False lets the MPRIS backend skip its Position read.
     """
+    if _use_mpris():
+        return mpris.get_track_info(live_position)
+
     info = {
         "title": "Unknown Title",
         "artist": "Unknown Artist",
@@ -46,32 +112,30 @@ def get_track_info():
     }
 
     try:
-        # We can fetch specific metadata keys using format strings
-        # This is faster than parsing a huge JSON block
-        
-        # Basic Strings
-        info["title"] = subprocess.check_output(["playerctl", "metadata", "xesam:title"], text=True).strip()
-        info["artist"] = subprocess.check_output(["playerctl", "metadata", "xesam:artist"], text=True).strip()
-        info["album"] = subprocess.check_output(["playerctl", "metadata", "xesam:album"], text=True).strip()
-        info["image_url"] = subprocess.check_output(["playerctl", "metadata", "mpris:artUrl"], text=True).strip()
-        
+        # One playerctl call for every field, tab separated
+        output = metrics.check_output(PLAYERCTL + ["metadata", "--format", TRACK_FORMAT], text=True)
+        title, artist, album, image_url, dur_micro, pos_micro = output.rstrip("\n").split("\t")
+
+        info["title"] = title
+        info["artist"] = artist
+        info["album"] = album
+        info["image_url"] = image_url
+
         # Time (playerctl returns microseconds, so we divide by 1,000,000)
-        dur_micro = subprocess.check_output(["playerctl", "metadata", "mpris:length"], text=True).strip()
         info["duration_sec"] = float(dur_micro) / 1000000 if dur_micro else 0
-
-        # Position (seconds), position fails if the player is stopped, so we wrap it
-        pos_str = subprocess.check_output(["playerctl", "position"], text=True).strip()
-        info["position_sec"] = float(pos_str) if pos_str else 0
+        info["position_sec"] = float(pos_micro) / 1000000 if pos_micro else 0
 
     except Exception as e:
         print(f"Metadata Error: {e}")
-        
+
     return info
 
 def get_track_position():
     """Returns current track position in seconds."""
+    if _use_mpris():
+        return mpris.get_track_position()
     try:
-        pos_str = subprocess.check_output(["playerctl", "position"], text=True).strip()
+        pos_str = metrics.check_output(PLAYERCTL + ["position"], text=True).strip()
         return round(float(pos_str)) if pos_str else 0
     except Exception:
-        return 0
\ No newline at end of file
+        return 0
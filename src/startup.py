@@ -1,4 +1,6 @@
-import subprocess, json, os
+import json, os
+import carla_osc
+import metrics
 from time import sleep
 import system_helper
 
@@ -14,7 +16,7 @@ def link_carla():
     try:
         print("🧹 Removing ALL existing PipeWire links...")
 
-        dump = subprocess.check_output(["pw-dump"], text=True)
+        dump = metrics.check_output(["pw-dump"], text=True)
         objects = json.loads(dump)
 
         # Remove ONLY real PipeWire Link objects
@@ -22,7 +24,7 @@ def link_carla():
             if obj.get("type") == "PipeWire:Interface:Link":
                 link_id = str(obj["id"])
                 print(f"   Removing link ID: {link_id}")
-                subprocess.run(
+                metrics.run(
                     ["pw-link", "-d", link_id],
                     check=False
                 )
@@ -48,13 +50,13 @@ def link_carla():
             return
 
         print("🔗 Linking VirtualCable → Carla Input")
-        subprocess.run(
+        metrics.run(
             ["pw-link", "VirtualCable", carla_in],
             check=True
         )
 
         print("🔗 Linking Carla Output → DAC")
-        subprocess.run(
+        metrics.run(
             ["pw-link", carla_out, hardware_sink],
             check=True
         )
@@ -69,8 +71,8 @@ def start_spotifyd(vol=50):
     Starts the spotifyd daemon.
     """
     try:
-        subprocess.run(["pkill", "spotifyd"], check=False)
-        subprocess.Popen(["spotifyd", "--initial-volume", str(vol)])
+        metrics.run(["pkill", "spotifyd"], check=False)
+        metrics.popen(["spotifyd", "--initial-volume", str(vol)])
         print("spotifyd started.")
     except Exception as e:
         print(f"Error starting spotifyd: {e}")
@@ -80,7 +82,7 @@ def set_default_sink():
     Sets the default PipeWire sink to the virtual cable.
     """
     try:
-        subprocess.run(["pactl", "set-default-sink", "VirtualCable"], check=True)
+        metrics.run(["pactl", "set-default-sink", "VirtualCable"], check=True)
         print("Default sink set to VirtualCable.")
     except Exception as e:
         print(f"Error setting default sink: {e}")
@@ -95,6 +97,9 @@ def start_up(vol=50, max_vol=50):
     sleep(5)  # Give services time to initialize
     link_carla()
     print("Carla connected to virtual cable and DAC.")
+    # launch.sh only waits a fixed time for Carla, so anything sent before it was
+    # listening is lost; don't let the shadow table suppress those values from now on
+    carla_osc.clear_shadow()
     system_helper.set_hardware_volume(max_vol)
     system_helper.set_hardware_volume(max_vol, forced_sink="alsa_output.platform-soc_107c000000_sound.stereo-fallback")
     print(f"Volume set to {max_vol}% on hardware sink.")
@@ -0,0 +1,103 @@
+import asyncio
+import json
+from threading import Lock
+
+# Versioned state document for push clients.
+# The controller publishes fields (volume, mode, track...) from whatever thread
+# noticed the change; every published change bumps the version. Clients remember
+# the last version they saw and ask for the delta since then, so a slow client
+# gets one merged delta instead of a backlog, and the JSON for a given
+# (since, version) pair is built once no matter how many clients want it.
+
+class StateHub:
+    def __init__(self):
+        self._lock = Lock()
+        self.version = 0
+        self._fields = {} # name -> value
+        self._changed_at = {} # name -> version of its last change
+        self._snapshot = (None, "") # (version, JSON) of the last snapshot()
+        self._deltas = {} # since -> JSON of delta(since), for the current version only
+        self._waiters = {} # event loop -> asyncio.Event, set on the next publish
+
+    def publish(self, **fields):
+        """Updates fields, bumping the version if any value actually changed. Safe from any thread."""
+        with self._lock:
+            changed = [name for name, value in fields.items() if name not in self._fields or self._fields[name] != value]
+            if not changed:
+                return self.version
+            self.version += 1
+            for name in changed:
+                self._fields[name] = fields[name]
+                self._changed_at[name] = self.version
+            self._deltas = {}
+            loops = list(self._waiters)
+
+        for loop in loops:
+            try:
+                loop.call_soon_threadsafe(self._wake, loop)
+            except RuntimeError:
+                with self._lock:
+                    self._waiters.pop(loop, None) # Loop was closed
+        return self.version
+
+    def get(self, name, default=None):
+        return self._fields.get(name, default)
+
+    def fields(self):
+        """Returns (version, copy of all fields) from the same instant."""
+        with self._lock:
+            return self.version, dict(self._fields)
+
+    def snapshot(self):
+        """
+        Returns (version, JSON) of the whole document, {"v": version, "full": true, "state": {...}}.
+        Serialized once per version.
+        """
+        with self._lock:
+            version, body = self._snapshot
+            if version != self.version:
+                body = json.dumps({"v": self.version, "full": True, "state": self._fields})
+                self._snapshot = (self.version, body)
+            return self.version, body
+
+    def delta(self, since):
+        """
+        Returns (version, JSON) of the fields changed after version `since`,
+        {"v": version, "since": since, "changes": {...}}. Shared by every client asking for the same since.
+        """
+        with self._lock:
+            body = self._deltas.get(since)
+            if body is None:
+                changes = {name: self._fields[name] for name, v in self._changed_at.items() if v > since}
+                body = json.dumps({"v": self.version, "since": since, "changes": changes})
+                self._deltas[since] = body
+            return self.version, body
+
+    async def wait_for_change(self, since, timeout=None):
+        """Waits until the version passes `since`, or timeout seconds. Returns the current version."""
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+
+        while self.version <= since:
+            # No await between the version check and taking the event, so a publish
+            # in between still sets the event we wait on
+            with self._lock:
+                event = self._waiters.get(loop)
+                if event is None:
+                    event = self._waiters[loop] = asyncio.Event()
+
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(event.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+        return self.version
+
+    def _wake(self, loop):
+        """Runs on `loop`: releases everyone waiting there; the next wait gets a fresh event."""
+        with self._lock:
+            event = self._waiters.pop(loop, None)
+        if event is not None:
+            event.set()
@@ -2,6 +2,9 @@ import subprocess
 import os
 import time
 
+import bluetooth_helper as bluetooth
+import metrics
+
 def is_spotify_active():
     """
     Checks if a user is actively connected to Spotifyd.
@@ -11,8 +14,8 @@ def is_spotify_active():
     try:
         # We check if spotifyd appears in the player list
         # If no user is connected, spotifyd usually doesn't show up in playerctl -l
-        output = subprocess.check_output(["playerctl", "-l"], text=True)
-        status = subprocess.check_output(["playerctl", "status"], text=True).strip()
+        output = metrics.check_output(["playerctl", "-l"], text=True)
+        status = metrics.check_output(["playerctl", "status"], text=True).strip()
         if "spotifyd" in output:
             print("Spotifyd is active.")
             if status == "Playing":
@@ -37,7 +40,7 @@ def play_sound(filepath, volume=16384):
     Plays a WAV file through PulseAudio/PipeWire using paplay.
     """
     if os.path.exists(filepath):
-        subprocess.Popen(["paplay", filepath, f"--volume={volume}"])  # Volume is 0-65536
+        metrics.popen(["paplay", filepath, f"--volume={volume}"])  # Volume is 0-65536
     else:
         print(f"Sound file not found: {filepath}")
 
@@ -48,9 +51,9 @@ def restart_spotifyd():
     print("--- KICKING SPOTIFY USER ---")
     try:
         # We assume spotifyd is running as a user service
-        subprocess.run(["pkill", "spotifyd"], check=False)
+        metrics.run(["pkill", "spotifyd"], check=False)
         time.sleep(1)  # Give it a moment to shut down
-        subprocess.Popen(["spotifyd"])
+        metrics.popen(["spotifyd"])
     except Exception as e:
         print(f"Error restarting spotifyd: {e}")
 
@@ -60,12 +63,10 @@ def enter_pairing_mode():
     """
     print("--- ENTERING PAIRING MODE ---")
     try:
-        # Using bluetoothctl to make the device discoverable and pairable
-        subprocess.run(["bluetoothctl", "disconnect"], check=False)
-        subprocess.run(["bluetoothctl", "power", "on"], check=False)
-        subprocess.run(["bluetoothctl", "discoverable", "on"], check=False)
-        subprocess.run(["bluetoothctl", "pairable", "on"], check=False)
-        subprocess.run(["bluetoothctl", "agent", "on"], check=False)
+        # Kick the current device, then open up the adapter over D-Bus
+        # (the pairing agent itself is provided by bt-agent.service)
+        bluetooth.disconnect_all()
+        bluetooth.set_adapter_properties(powered=True, discoverable=True, pairable=True)
         print("Bluetooth is now in pairing mode.")
     except Exception as e:
         print(f"Error entering pairing mode: {e}")
@@ -76,7 +77,7 @@ def turn_off_bluetooth():
     """
     print("--- TURNING OFF BLUETOOTH ---")
     try:
-        subprocess.run(["bluetoothctl", "power", "off"], check=False)
+        bluetooth.set_adapter_properties(powered=False)
         print("Bluetooth has been turned off.")
     except Exception as e:
         print(f"Error turning off Bluetooth: {e}")
@@ -87,7 +88,7 @@ def turn_on_bluetooth():
     """
     print("--- TURNING ON BLUETOOTH ---")
     try:
-        subprocess.run(["bluetoothctl", "power", "on"], check=False)
+        bluetooth.set_adapter_properties(powered=True)
         print("Bluetooth has been turned on.")
     except Exception as e:
         print(f"Error turning on Bluetooth: {e}")
@@ -99,7 +100,7 @@ def find_hardware_sink():
     """
     try:
         # List all sinks in short format
-        output = subprocess.check_output(["pactl", "list", "short", "sinks"], text=True)
+        output = metrics.check_output(["pactl", "list", "short", "sinks"], text=True)
         
         for line in output.splitlines():
             parts = line.split()
@@ -126,7 +127,7 @@ def set_hardware_volume(volume_percent=50, forced_sink=None):
         if target_sink:
             print(f"Targeting Hardware Sink: {target_sink}")
             # Set volume
-            subprocess.run([
+            metrics.run([
                 "pamixer", 
                 "--sink", target_sink, 
                 "--set-volume", str(volume_percent)
@@ -142,7 +143,7 @@ def scan_wifi_networks():
     Scans for available WiFi networks using 'nmcli' and returns a list of SSIDs.
     """
     try:
-        output = subprocess.check_output(["nmcli", "-t", "-f", "SSID,SIGNAL", "dev", "wifi"], text=True)
+        output = metrics.check_output(["nmcli", "-t", "-f", "SSID,SIGNAL", "dev", "wifi"], text=True)
         ssids = []
         for line in output.splitlines():
             print(line)
@@ -161,7 +162,7 @@ def connect_to_wifi(ssid, password):
     """
     try:
         print(f"Connecting to WiFi SSID: {ssid}")
-        subprocess.run([
+        metrics.run([
             "nmcli", "dev", "wifi", "connect", ssid, "password", password
         ], check=True)
         print("WiFi connection initiated.")
@@ -174,7 +175,7 @@ def create_temp_hotspot():
     """
     try:
         print("Creating temporary WiFi hotspot 'Nexo-Setup'")
-        subprocess.run([
+        metrics.run([
             "nmcli", "dev", "wifi", "hotspot", "ifname", "wlan0", 
             "con-name", "Nexo-Setup", "ssid", "Nexo-Setup", "band", "bg", 
             "password", ""
@@ -189,7 +190,7 @@ def get_current_wifi_ssid():
     Returns the SSID as a string, or None if not connected.
     """
     try:
-        output = subprocess.check_output(
+        output = metrics.check_output(
             ["iwgetid", "-r"],
             text=True
         ).strip()
@@ -211,30 +212,5 @@ def get_track_info_bluetooth():
     """
     Returns a dictionary with current track details.
     """
-    info = {
-        "title": "Unknown Title",
-        "artist": "Unknown Artist",
-        "album": "Unknown Album",
-        "image_url": "",
-        "duration_sec": 0,
-        "position_sec": 0,
-    }
-
-    try:        
-        # Basic Strings
-        info["title"] = subprocess.check_output(["playerctl", "metadata", "xesam:title"], text=True).strip()
-        info["artist"] = subprocess.check_output(["playerctl", "metadata", "xesam:artist"], text=True).strip()
-        info["album"] = subprocess.check_output(["playerctl", "metadata", "xesam:album"], text=True).strip()
-        
-        # Time (playerctl returns microseconds, so we divide by 1,000,000)
-        dur_micro = subprocess.check_output(["playerctl", "metadata", "mpris:length"], text=True).strip()
-        info["duration_sec"] = float(dur_micro) / 1000000 if dur_micro else 0
-
-        # Position (seconds), position fails if the player is stopped, so we wrap it
-        pos_str = subprocess.check_output(["playerctl", "position"], text=True).strip()
-        info["position_sec"] = float(pos_str) if pos_str else 0
-
-    except Exception as e:
-        print(f"Metadata Error: {e}")
-        
-    return info
\ No newline at end of file
+    # BlueZ exposes the phone's AVRCP metadata directly, one D-Bus call instead of 5 playerctl forks
+    return bluetooth.get_track_info()
@@ -0,0 +1,142 @@
+import functools
+import os
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import count
+from threading import current_thread, get_ident
+from time import perf_counter_ns
+
+# Span tracing for input latency.
+# A trace starts where an event enters the system (a button press, an API
+# request, a /ws/control value); every span opened while it runs carries its
+# trace id. The current span lives in a contextvar, so it follows asyncio
+# tasks and the API threadpool by itself; thread hand-offs (the volume actor,
+# command queues) capture current() and attach() it on the other side.
+# Finished spans go into a ring buffer, exported as Chrome trace-event JSON
+# that opens in Perfetto or chrome://tracing.
+# Outside a trace, span() and @traced cost one contextvar lookup.
+
+TRACE_BUFFER = 4096 # Finished spans kept in memory
+
+_spans = deque(maxlen=TRACE_BUFFER) # (trace_id, span_id, parent_id, name, tid, start_us, dur_us, args)
+_thread_names = {} # tid -> thread name, for the exported track names
+_current = ContextVar("nexo_trace", default=None) # (trace_id, span_id) of the open span
+_span_ids = count(1)
+
+def now():
+    """Trace clock in microseconds (monotonic)."""
+    return perf_counter_ns() // 1000
+
+def current():
+    """The open span as (trace_id, span_id), or None outside a trace. Hand it to attach() in another thread."""
+    return _current.get()
+
+@contextmanager
+def attach(context):
+    """Makes spans in this block children of context (from current() in another thread). None is a no-op."""
+    if context is None:
+        yield
+        return
+    token = _current.set(context)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+@contextmanager
+def trace(name, **args):
+    """Starts a new trace with a root span, yielding its trace id. Inside a trace it is just a span."""
+    parent = _current.get()
+    if parent is not None:
+        with span(name, **args):
+            yield parent[0]
+        return
+    trace_id = os.urandom(8).hex()
+    with _open(trace_id, None, name, args):
+        yield trace_id
+
+@contextmanager
+def span(name, **args):
+    """Records the block as a child of the open span. Does nothing outside a trace."""
+    parent = _current.get()
+    if parent is None:
+        yield
+        return
+    with _open(parent[0], parent[1], name, args):
+        yield
+
+@contextmanager
+def _open(trace_id, parent_id, name, args):
+    span_id = next(_span_ids)
+    token = _current.set((trace_id, span_id))
+    start = now()
+    try:
+        yield
+    finally:
+        _current.reset(token)
+        _record(trace_id, span_id, parent_id, name, start, now() - start, args)
+
+def traced(name):
+    """Decorator form of span(), for helper functions on the input path."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def record(name, context, start, end=None, **args):
+    """
+    Records a span that was not a with-block (e.g. time spent waiting in a queue),
+    from start to end (now() values) under context. Does nothing when context is None.
+    """
+    if context is None:
+        return
+    end = now() if end is None else end
+    _record(context[0], next(_span_ids), context[1], name, start, max(0, end - start), args)
+
+def _record(trace_id, span_id, parent_id, name, start, duration, args):
+    tid = get_ident()
+    if tid not in _thread_names:
+        _thread_names[tid] = current_thread().name
+    _spans.append((trace_id, span_id, parent_id, name, tid, start, duration, args))
+
+# Export
+
+def recent(limit=20):
+    """The newest root spans: trace id, name, start and duration, newest first."""
+    roots = [span for span in list(_spans) if span[2] is None]
+    return [
+        {"trace_id": trace_id, "name": name, "duration_ms": round(duration / 1000, 3), **args}
+        for trace_id, _, _, name, _, _, duration, args in reversed(roots[-limit:])
+    ]
+
+def export_chrome(trace_id=None):
+    """
+    The ring buffer (or one trace) as Chrome trace-event JSON.
+    Spans are complete ("X") events on their thread's track; a span whose parent ran on
+    another thread is linked to it with a flow arrow, so hand-offs show up as arrows.
+    """
+    spans = [span for span in list(_spans) if trace_id is None or span[0] == trace_id]
+    by_id = {span[1]: span for span in spans}
+    pid = os.getpid()
+
+    events = []
+    for tid in {span[4] for span in spans}:
+        events.append({"ph": "M", "name": "thread_name", "pid": pid, "tid": tid, "args": {"name": _thread_names.get(tid, str(tid))}})
+
+    for span_trace, span_id, parent_id, name, tid, start, duration, args in spans:
+        events.append({
+            "ph": "X", "name": name, "cat": "nexo", "pid": pid, "tid": tid, "ts": start, "dur": duration,
+            "args": {"trace_id": span_trace, "span_id": span_id, "parent_id": parent_id, **args},
+        })
+        parent = by_id.get(parent_id)
+        if parent is not None and parent[4] != tid:
+            events.append({"ph": "s", "name": "handoff", "cat": "nexo", "id": span_id, "pid": pid, "tid": parent[4], "ts": parent[5]})
+            events.append({"ph": "f", "bp": "e", "name": "handoff", "cat": "nexo", "id": span_id, "pid": pid, "tid": tid, "ts": start})
+
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
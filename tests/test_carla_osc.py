@@ -0,0 +1,55 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+pytest.importorskip("pythonosc")
+import carla_osc
+
+# The shadow table drops values Carla already has. Values sent before Carla
+# was listening never arrived, so startup clears the table once Carla is linked
+# and every later value goes out again.
+
+class _RecordingClient:
+    def __init__(self):
+        self.messages = []
+
+    def send_message(self, address, args):
+        self.messages.append((address, args))
+
+    def send(self, content):
+        self.messages.append(("bundle", content))
+
+@pytest.fixture
+def client(monkeypatch):
+    recording = _RecordingClient()
+    monkeypatch.setattr(carla_osc, "client", recording)
+    carla_osc.clear_shadow()
+    return recording
+
+def test_repeated_value_is_suppressed(client):
+    carla_osc.set_splitter_volume(1, -6.0)
+    carla_osc.set_splitter_volume(1, -6.0)
+    assert len(client.messages) == 1
+
+def test_clear_shadow_forces_a_resend(client):
+    carla_osc.set_splitter_volume(1, -6.0)
+    carla_osc.clear_shadow()
+    carla_osc.set_splitter_volume(1, -6.0)
+    assert len(client.messages) == 2
+    assert carla_osc.get_parameter(carla_osc.WOOFER_SPLITTER, carla_osc.PARAM_SPLITTER_MASTER) is not None
+
+def test_startup_clears_shadow_after_linking_carla(client, monkeypatch):
+    startup = pytest.importorskip("startup")
+    # A value sent while Carla was still starting up (lost on the wire, but recorded)
+    monkeypatch.setattr(startup, "link_carla", lambda: carla_osc.set_splitter_volume(1, -6.0))
+    monkeypatch.setattr(startup, "start_spotifyd", lambda vol: None)
+    monkeypatch.setattr(startup, "set_default_sink", lambda: None)
+    monkeypatch.setattr(startup, "sleep", lambda seconds: None)
+    monkeypatch.setattr(startup.system_helper, "set_hardware_volume", lambda *args, **kwargs: None)
+
+    startup.start_up()
+    carla_osc.set_splitter_volume(1, -6.0)
+    assert len(client.messages) == 2
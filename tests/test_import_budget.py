@@ -0,0 +1,73 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+# Importing a module must not fork (iwgetid, amixer...) or do slow work:
+# main.py imports everything before the speaker can play a note.
+# Each module is imported in a fresh interpreter with an audit hook that
+# records process spawns, against a config file that already exists, as on
+# any boot after the first.
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+MODULES = ["data_handler", "carla_osc", "led_helper", "api"]
+IMPORT_BUDGET = 3.0 # Seconds per module; generous, a Pi 4 is several times slower than a dev box
+
+_CHILD = """
+import json, sys
+from time import perf_counter
+forks = []
+def hook(event, args):
+    if event in ("subprocess.Popen", "os.fork", "os.forkpty", "os.posix_spawn", "os.exec", "os.system"):
+        forks.append(f"{event} {str(args)[:100]}")
+sys.addaudithook(hook)
+start = perf_counter()
+try:
+    __import__(sys.argv[1])
+except ModuleNotFoundError as e:
+    print(json.dumps({"missing": e.name}))
+    sys.exit(0)
+print(json.dumps({"seconds": perf_counter() - start, "forks": forks}))
+"""
+
+@pytest.fixture(scope="module")
+def env(tmp_path_factory):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(SRC), env.get("PYTHONPATH")]))
+    env["NEXO_CONFIG_FILE"] = str(tmp_path_factory.mktemp("config") / "nexo_config.json")
+    env.setdefault("GPIOZERO_PIN_FACTORY", "mock")
+    # First run creates the config (and is allowed to fork iwgetid doing it)
+    subprocess.run([sys.executable, "-c", "import data_handler"], env=env, capture_output=True, timeout=60)
+    if not Path(env["NEXO_CONFIG_FILE"]).exists():
+        pytest.skip("could not create a config file to import against")
+    return env
+
+def _slowest_imports(stderr, limit=5):
+    """The slowest entries of a -X importtime report, by self time."""
+    rows = []
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            self_us, _, name = line[len("import time:"):].split("|", 2)
+            if self_us.strip().isdigit():
+                rows.append((int(self_us), name.strip()))
+    return ", ".join(f"{name} {us / 1000:.0f} ms" for us, name in sorted(rows, reverse=True)[:limit])
+
+@pytest.mark.parametrize("module", MODULES)
+def test_import_does_not_fork_and_stays_in_budget(module, env):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD, module],
+        env=env, capture_output=True, text=True, timeout=60,
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    if "missing" in report:
+        pytest.skip(f"{report['missing']} is not installed")
+
+    print(f"{module:12s} {report['seconds'] * 1000:7.1f} ms  slowest: {_slowest_imports(result.stderr)}")
+    assert report["forks"] == [], f"importing {module} spawned processes: {report['forks']}"
+    assert report["seconds"] < IMPORT_BUDGET, (
+        f"importing {module} took {report['seconds']:.2f} s; slowest: {_slowest_imports(result.stderr)}"
+    )